@@ -0,0 +1,69 @@
+import argparse
+import json
+import timeit
+
+from box import Box
+from cerberus import Validator
+
+from conductor import messages
+from conductor.network import Network
+
+SNAPSHOT = dict(question='What is the answer?', users=[f'user{i}' for i in range(10)], lost=['user1'], challenged=None)
+REQUEST = '{"answer":2}'
+QUERY = {'uid': 'mario', 'encoding': 'json'}
+
+
+def box_event():
+    body = Box(event='snapshot', **SNAPSHOT)
+    return json.dumps(body, separators=(',', ':'))
+
+
+def model_event():
+    return messages.encode(messages.snapshot(**SNAPSHOT))
+
+
+def box_request():
+    return Box(json.loads(REQUEST)).answer
+
+
+def model_request():
+    return messages.Request.parse(json.loads(REQUEST)).answer
+
+
+def cerberus_validator():
+    return Validator(Network.request_schema).validate(Box(QUERY))
+
+
+def compiled_validator():
+    return Network.validate_query(Box(QUERY))
+
+
+CASES = [
+    ('encode event', box_event, model_event),
+    ('decode request', box_request, model_request),
+    ('validate query', cerberus_validator, compiled_validator),
+]
+
+
+def measure(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Box and cerberus with the message model')
+    parser.add_argument('--number', type=int, default=10000)
+    args = parser.parse_args()
+    report = {}
+    for name, before, after in CASES:
+        before_seconds = measure(before, args.number)
+        after_seconds = measure(after, args.number)
+        report[name] = {
+            'before_us': round(before_seconds * 1e6, 3),
+            'after_us': round(after_seconds * 1e6, 3),
+            'speedup': round(before_seconds / after_seconds, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
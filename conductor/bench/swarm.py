@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from itertools import cycle
+from unittest.mock import AsyncMock
+
+import aiohttp
+from aiohttp import web
+from box import Box
+
+from conductor.game import Conductor
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.rooms import Room, RoomManager
+from conductor.server import application
+
+STUB_ANSWER = 0
+
+
+class StubQuizSource:
+    def __init__(self):
+        self.quiz = cycle([
+            Box(question=f'Question {i}?', answers=['a', 'b', 'c', 'd'], answer=STUB_ANSWER) for i in range(100)
+        ])
+
+    async def next(self):
+        return next(self.quiz)
+
+    async def close(self):
+        pass
+
+
+class Stats:
+    def __init__(self):
+        self.joins = []
+        self.challenges = []
+        self.events = 0
+        self.rejected = 0
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def resident_memory():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+async def memory(_request):
+    return web.json_response({'rss': resident_memory()})
+
+
+def run_server(port, options):
+    def new_room(room_id):
+        conductor = Conductor(
+            quiz_source=quiz_source,
+            challenge_timeout_seconds=options.challenge_timeout,
+            seconds_before_new_session=options.seconds_before_new_session,
+        )
+        network = Network(
+            registry=SocketRegistry(options.players),
+            on_enter=conductor.on_enter,
+            on_message=conductor.on_message,
+            on_exit=conductor.on_exit,
+            room=room_id
+        )
+        return Room(room_id, network, conductor)
+
+    quiz_source = StubQuizSource()
+    rooms = RoomManager(new_room, options.rooms)
+    app = application(rooms, shutdown=AsyncMock())
+    app.add_routes([web.get('/bench/memory', memory)])
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+async def play(session, url, uid, room, options, stats, stopped):
+    state = Box(alive=False, challenged_at=None)
+
+    async def send(body):
+        try:
+            await ws.send_json(body)
+        except ConnectionError:
+            pass
+
+    async def challenge():
+        while not stopped.is_set():
+            await asyncio.sleep(random.expovariate(options.challenge_rate))
+            if state.alive and not ws.closed:
+                state.challenged_at = time.perf_counter()
+                await send({'action': 'challenge'})
+
+    async def answer():
+        await asyncio.sleep(options.answer_latency)
+        correct = random.random() < options.accuracy
+        await send({'answer': STUB_ANSWER if correct else STUB_ANSWER + 1})
+
+    start = time.perf_counter()
+    async with session.ws_connect(f'{url}/play', params={'uid': uid, 'room': room}) as ws:
+        ready = await ws.receive_json()
+        if ready['event'] != 'ready':
+            stats.rejected += 1
+            return
+        stats.joins.append(time.perf_counter() - start)
+        challenger = asyncio.ensure_future(challenge())
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                stats.events += 1
+                data = json.loads(msg.data)
+                if data['event'] in ('question', 'snapshot'):
+                    state.alive = uid not in data.get('lost', ())
+                elif data['event'] == 'lost' and data['user'] == uid:
+                    state.alive = False
+                elif data['event'] == 'reply' and state.challenged_at:
+                    stats.challenges.append(time.perf_counter() - state.challenged_at)
+                    asyncio.ensure_future(answer())
+        finally:
+            challenger.cancel()
+
+
+async def wait_server(session, url):
+    for _ in range(100):
+        try:
+            async with session.get(f'{url}/bench/memory') as res:
+                return (await res.json())['rss']
+        except aiohttp.ClientConnectionError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError('benchmark server did not start')
+
+
+async def bench(url, options):
+    stats = Stats()
+    stopped = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        rss_before = await wait_server(session, url)
+        start = time.perf_counter()
+        players = [
+            asyncio.ensure_future(play(session, url, f'p{player}', f'r{room}', options, stats, stopped))
+            for room in range(options.rooms)
+            for player in range(options.players)
+        ]
+        while len(stats.joins) + stats.rejected < len(players) and not all(player.done() for player in players):
+            await asyncio.sleep(0.01)
+        join_seconds = time.perf_counter() - start
+        async with session.get(f'{url}/bench/memory') as res:
+            rss_after = (await res.json())['rss']
+        events_before = stats.events
+        await asyncio.sleep(options.duration)
+        events = stats.events - events_before
+        stopped.set()
+        for player in players:
+            player.cancel()
+        await asyncio.gather(*players, return_exceptions=True)
+    connections = len(stats.joins)
+    return {
+        'rooms': options.rooms,
+        'players_per_room': options.players,
+        'connections': connections,
+        'rejected': stats.rejected,
+        'joins_per_second': connections / join_seconds,
+        'join_latency_p50': percentile(stats.joins, 50),
+        'join_latency_p99': percentile(stats.joins, 99),
+        'events_per_second': events / options.duration,
+        'challenges': len(stats.challenges),
+        'challenge_latency_p50': percentile(stats.challenges, 50),
+        'challenge_latency_p99': percentile(stats.challenges, 99),
+        'memory_per_connection': (rss_after - rss_before) / connections if connections else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the conductor with a swarm of WebSocket players')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--players', type=int, default=8, help='players per room')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of play after all players joined')
+    parser.add_argument('--challenge-rate', type=float, default=0.5, help='challenges per player per second')
+    parser.add_argument('--answer-latency', type=float, default=0.2, help='seconds taken to answer')
+    parser.add_argument('--accuracy', type=float, default=0.5, help='probability of a correct answer')
+    parser.add_argument('--challenge-timeout', type=int, default=5)
+    parser.add_argument('--seconds-before-new-session', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    options = parser.parse_args()
+
+    server = multiprocessing.Process(target=run_server, args=(options.port, options), daemon=True)
+    server.start()
+    try:
+        report = asyncio.run(bench(f'http://127.0.0.1:{options.port}', options))
+    finally:
+        server.terminate()
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as fp:
+            fp.write(output)
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from aiohttp import web
+
+from conductor import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = re.compile(r'^(text/|application/(javascript|json|xml|manifest\+json)|image/svg\+xml)')
+HASHED = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+sent_bytes = metrics.counter('conductor_asset_bytes_total', 'Static asset bytes sent by encoding', label='encoding')
+not_modified = metrics.counter('conductor_asset_not_modified_total', 'Static asset requests answered by ETag')
+
+
+def compress(data):
+    encodings = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        encodings['br'] = brotli.compress(data)
+    return {encoding: body for encoding, body in encodings.items() if len(body) < len(data)}
+
+
+def is_compressible(path):
+    content_type, _ = mimetypes.guess_type(path)
+    return bool(content_type and COMPRESSIBLE.match(content_type))
+
+
+class Asset:
+    __slots__ = ('path', 'content_type', 'etag', 'cache_control', 'bodies')
+
+    def __init__(self, path, data, cache_control, bodies=None):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = f'"{hashlib.blake2b(data, digest_size=8).hexdigest()}"'
+        self.cache_control = cache_control
+        self.bodies = bodies
+
+
+class Assets:
+    def __init__(self, root, max_memory_size=256 * 1024, index='index.html'):
+        self.root = os.path.abspath(root)
+        self.max_memory_size = max_memory_size
+        self.index = index
+        self.assets = {}
+        self._load()
+
+    def _load(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name.endswith(('.gz', '.br')) and os.path.exists(path[:-3]):
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                self.assets[key] = self._asset(path, key)
+        logging.info('%s: %s static assets loaded', self.root, len(self.assets))
+
+    def _asset(self, path, key):
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        cache_control = IMMUTABLE if HASHED.search(key) else REVALIDATE
+        if len(data) > self.max_memory_size:
+            return Asset(path, data, cache_control)
+        bodies = {'identity': data}
+        if is_compressible(path):
+            bodies.update(self._precompressed(path) or compress(data))
+        return Asset(path, data, cache_control, bodies)
+
+    @staticmethod
+    def _precompressed(path):
+        bodies = {}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.exists(path + suffix):
+                with open(path + suffix, 'rb') as fp:
+                    bodies[encoding] = fp.read()
+        return bodies
+
+    async def handler(self, request):
+        asset = self.assets.get(request.match_info.get('path') or self.index)
+        if not asset:
+            raise web.HTTPNotFound()
+        headers = {'ETag': asset.etag, 'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+        if asset.etag in request.headers.get('If-None-Match', ''):
+            not_modified.inc()
+            return web.Response(status=304, headers=headers)
+        if not asset.bodies:
+            sent_bytes.inc('file', os.path.getsize(asset.path))
+            return web.FileResponse(asset.path, headers=headers)
+        encoding = self._negotiate(asset, request.headers.get('Accept-Encoding', ''))
+        body = asset.bodies[encoding]
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        sent_bytes.inc(encoding, len(body))
+        return web.Response(body=body, content_type=asset.content_type, headers=headers)
+
+    @staticmethod
+    def _negotiate(asset, accept_encoding):
+        accepted = {it.split(';')[0].strip() for it in accept_encoding.split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in asset.bodies:
+                return encoding
+        return 'identity'
+
+
+def precompress(root):
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.endswith(('.gz', '.br')) or not is_compressible(path):
+                continue
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            for encoding, body in compress(data).items():
+                with open(path + ('.br' if encoding == 'br' else '.gz'), 'wb') as fp:
+                    fp.write(body)
+                written += 1
+    logging.info('%s: %s compressed files written', root, written)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write gzip and brotli versions of the static files next to them')
+    parser.add_argument('root', help='path of the web application build')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    precompress(args.root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import html
+import json
+import logging
+import random
+import sqlite3
+import threading
+
+from conductor.quiz import make_question
+from conductor.seen import skipped_questions
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    question TEXT NOT NULL UNIQUE,
+    correct_answer TEXT NOT NULL,
+    incorrect_answers TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS questions_draw ON questions (category, difficulty, seq);
+'''
+
+
+class QuestionBank:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self._load_counts()
+
+    def _load_counts(self):
+        self.counts = {
+            (category, difficulty): total
+            for category, difficulty, total in self.db.execute(
+                'SELECT category, difficulty, max(seq) FROM questions GROUP BY category, difficulty')
+        }
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, results):
+        added = 0
+        with self.lock:
+            with self.db:
+                for result in results:
+                    group = (result.get('category', ''), result.get('difficulty', ''))
+                    cursor = self.db.execute(
+                        'INSERT OR IGNORE INTO questions '
+                        '(category, difficulty, seq, question, correct_answer, incorrect_answers) '
+                        'SELECT ?, ?, COALESCE(max(seq), 0) + 1, ?, ?, ? FROM questions '
+                        'WHERE category = ? AND difficulty = ?',
+                        (*group, result['question'], result['correct_answer'],
+                         json.dumps(result['incorrect_answers']), *group))
+                    added += cursor.rowcount
+            self._load_counts()
+        return added
+
+    def draw(self, category=None, difficulty=None):
+        from box import Box
+
+        with self.lock:
+            groups = [(group, total) for group, total in self.counts.items()
+                      if category in (None, group[0]) and difficulty in (None, group[1])]
+            position = random.randrange(sum(total for _, total in groups) or 1)
+            for (group_category, group_difficulty), total in groups:
+                if position < total:
+                    row = self.db.execute(
+                        'SELECT category, difficulty, question, correct_answer, incorrect_answers FROM questions '
+                        'WHERE category = ? AND difficulty = ? AND seq = ?',
+                        (group_category, group_difficulty, position + 1)).fetchone()
+                    return Box(category=row[0], difficulty=row[1], question=row[2], correct_answer=row[3],
+                               incorrect_answers=json.loads(row[4]))
+                position -= total
+        return None
+
+    def close(self):
+        self.db.close()
+
+
+class LocalQuizSource:
+    def __init__(self, bank, category=None, difficulty=None, seen=None, max_draws=5):
+        self.bank = bank
+        self.category = category
+        self.difficulty = difficulty
+        self.seen = seen
+        self.max_draws = max_draws
+
+    async def next(self):
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(None, self._draw)
+        if not result:
+            raise RuntimeError('The question bank is empty')
+        question = make_question(result)
+        if self.seen:
+            self.seen.add(question.question)
+        return question
+
+    def _draw(self):
+        result = None
+        for _ in range(self.max_draws if self.seen else 1):
+            result = self.bank.draw(self.category, self.difficulty)
+            if not result or not self.seen or html.unescape(result.question) not in self.seen:
+                break
+            skipped_questions.inc()
+        return result
+
+    async def warm_up(self):
+        pass
+
+    async def add(self, results):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.bank.add, results)
+
+    async def close(self):
+        self.bank.close()
+
+
+def _find_results(buffer):
+    key = buffer.find('"results"')
+    if key >= 0:
+        return buffer.find('[', key)
+    stripped = buffer.lstrip()
+    if stripped.startswith('['):
+        return len(buffer) - len(stripped)
+    return -1
+
+
+def read_results(fp, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    start = -1
+    while start < 0:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+        start = _find_results(buffer)
+    position = start + 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            result, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield result
+
+
+def import_dumps(path, dumps, batch_size=1000):
+    bank = QuestionBank(path)
+    added = 0
+    for dump in dumps:
+        with open(dump, encoding='utf-8') as fp:
+            batch = []
+            for result in read_results(fp):
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    added += bank.add(batch)
+                    batch = []
+            added += bank.add(batch)
+        logging.info('%s: imported', dump)
+    logging.info('%s: %s questions added, %s in total', path, added, len(bank))
+    bank.close()
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import OpenTrivia JSON dumps into a local question bank')
+    parser.add_argument('bank', help='path of the SQLite question bank')
+    parser.add_argument('dumps', nargs='+', help='OpenTrivia api.php responses or arrays of results')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    import_dumps(args.bank, args.dumps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import asyncio
+import selectors
+
+
+class Clock:
+    def time(self):
+        return asyncio.get_event_loop().time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def wait_for(self, awaitable, timeout):
+        return await asyncio.wait_for(awaitable, timeout)
+
+
+class VirtualClock(Clock):
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def new_event_loop(self):
+        loop = asyncio.SelectorEventLoop(VirtualSelector(self))
+        loop.time = self.time
+        return loop
+
+    def run(self, main):
+        loop = self.new_event_loop()
+        try:
+            return loop.run_until_complete(main)
+        finally:
+            loop.close()
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0) if len(self.get_map()) > 1 else []
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            raise RuntimeError('Virtual time cannot advance: every task is waiting without a timer')
+        self.clock.advance(timeout)
+        return events
@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import zlib
+
+from aiohttp import web
+
+
+class Router:
+    def __init__(self, worker, workers, port_base):
+        self.worker = worker
+        self.workers = workers
+        self.port_base = port_base
+
+    def owner(self, room_id):
+        return zlib.crc32(room_id.encode()) % self.workers
+
+    def owns(self, room_id):
+        return self.owner(room_id) == self.worker
+
+    def port(self, room_id):
+        return self.port_base + self.owner(room_id)
+
+
+def room_entry(room_id, worker, users):
+    return {'id': room_id, 'worker': worker, 'users': users}
+
+
+class LocalDirectory:
+    def __init__(self, rooms):
+        self.rooms_manager = rooms
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def rooms(self):
+        return [room_entry(room_id, 0, users) for room_id, users in self.rooms_manager.table().items()]
+
+    async def find(self, uid):
+        return [room for room in await self.rooms() if uid in room['users']]
+
+
+class Directory:
+    def __init__(self):
+        self.tables = {}
+
+    def rooms(self):
+        return [
+            room_entry(room_id, worker, users)
+            for worker, table in sorted(self.tables.items())
+            for room_id, users in table.items()
+        ]
+
+    async def serve(self, sock):
+        return await asyncio.start_unix_server(self._handle_client, sock=sock)
+
+    async def _handle_client(self, reader, writer):
+        worker = None
+        try:
+            async for line in reader:
+                request = json.loads(line)
+                if request['op'] == 'sync':
+                    worker = request['worker']
+                    self.tables[worker] = request['rooms']
+                    continue
+                rooms = self.rooms()
+                if request['op'] == 'find':
+                    rooms = [room for room in rooms if request['uid'] in room['users']]
+                writer.write(json.dumps({'id': request['id'], 'rooms': rooms}).encode() + b'\n')
+        except (ConnectionError, ValueError):
+            logging.exception('directory connection failed')
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.tables.pop(worker, None)
+            writer.close()
+
+
+class DirectoryClient:
+    def __init__(self, path, worker, rooms, sync_seconds=1):
+        self.path = path
+        self.worker = worker
+        self.rooms_manager = rooms
+        self.sync_seconds = sync_seconds
+        self.ids = itertools.count()
+        self.pending = {}
+        self.writer = None
+        self.tasks = []
+
+    async def start(self, tentatives=50):
+        for _ in range(tentatives):
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (ConnectionError, FileNotFoundError):
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError(f'Cannot connect to the cluster directory at {self.path}')
+        self.tasks = [asyncio.ensure_future(self._read_replies(reader)), asyncio.ensure_future(self._sync())]
+
+    async def _read_replies(self, reader):
+        async for line in reader:
+            reply = json.loads(line)
+            future = self.pending.pop(reply['id'], None)
+            if future and not future.done():
+                future.set_result(reply['rooms'])
+
+    async def _sync(self):
+        while True:
+            self._write(op='sync', worker=self.worker, rooms=self.rooms_manager.table())
+            await asyncio.sleep(self.sync_seconds)
+
+    def _write(self, **request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+
+    async def _request(self, **request):
+        request_id = next(self.ids)
+        future = self.pending[request_id] = asyncio.get_event_loop().create_future()
+        self._write(id=request_id, **request)
+        return await asyncio.wait_for(future, timeout=5)
+
+    async def rooms(self):
+        return await self._request(op='rooms')
+
+    async def find(self, uid):
+        return await self._request(op='find', uid=uid)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+def rooms_handler(directory):
+    async def handler(request):
+        uid = request.query.get('uid')
+        rooms = await directory.find(uid) if uid else await directory.rooms()
+        return web.json_response(rooms)
+
+    return handler
+
+
+async def serve_worker(app_factory, ports):
+    runner = web.AppRunner(await app_factory)
+    await runner.setup()
+    for port in ports:
+        await web.TCPSite(runner, port=port, reuse_port=True).start()
+    logging.info('worker %s listening on ports %s', os.getpid(), ports)
+    stopped = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    await stopped.wait()
+    await runner.cleanup()
+
+
+def supervise(workers, run_worker, path):
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    pids = []
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            status = 1
+            try:
+                run_worker(worker)
+                status = 0
+            except BaseException:
+                logging.exception('worker %s failed', worker)
+            finally:
+                os._exit(status)
+        pids.append(pid)
+    logging.info('started workers %s', pids)
+    try:
+        asyncio.run(_run_directory(sock, pids))
+    finally:
+        for pid in pids:
+            _terminate(pid)
+        os.unlink(path)
+
+
+async def _run_directory(sock, pids):
+    stopped = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    server = await Directory().serve(sock)
+    while not stopped.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid in pids:
+            logging.error('worker %s exited with status %s, stopping the cluster', pid,
+                          os.WEXITSTATUS(status) if os.WIFEXITED(status) else status)
+            pids.remove(pid)
+            break
+        try:
+            await asyncio.wait_for(stopped.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+    while pids:
+        _terminate(pids.pop())
+    server.close()
+
+
+def _terminate(pid):
+    try:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
@@ -0,0 +1,143 @@
+import heapq
+
+from conductor.messages import Request
+
+JSON = 'json'
+BINARY = 'binary'
+ENCODINGS = (JSON, BINARY)
+
+EVENTS = ('question', 'snapshot', 'joined', 'left', 'challenged', 'reply', 'lost', 'end')
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+
+BATCH = 0x7f
+
+CHALLENGE = 0
+ANSWER = 1
+
+
+# Game events as one byte event code, the sequence number (0 when missing, else 1 + seq) and the
+# event fields in a fixed order.
+# Integers are unsigned LEB128 varints, strings a varint byte length followed by UTF-8 bytes.
+# Users are interned per room: `joined` and `snapshot` define an index for each uid, the other
+# events refer to users as 2 + index, 1 followed by the uid when unknown, 0 when missing.
+# The index of a user who left is reused by the next definition, so the table only grows with the room.
+# Clients keep their table when resuming in the same room, since replayed events refer to it.
+# Coalesced events are sent as the BATCH code, the number of events and the events one after the other.
+class BinaryCodec:
+    def __init__(self):
+        self.uids = {}
+        self.free = []
+
+    def encode(self, body, seq=None):
+        out = bytearray([EVENT_CODES[body.event]])
+        _put_uint(out, 0 if seq is None else seq + 1)
+        getattr(self, f'_encode_{body.event}')(out, body)
+        return bytes(out)
+
+    def _encode_question(self, out, body):
+        _put_str(out, body.question)
+
+    def _encode_snapshot(self, out, body):
+        _put_opt_str(out, body.question)
+        _put_uint(out, len(body.users))
+        for user in body.users:
+            self._put_definition(out, user)
+        _put_uint(out, len(body.lost))
+        for user in body.lost:
+            self._put_user(out, user)
+        self._put_user(out, body.challenged)
+
+    def _encode_joined(self, out, body):
+        self._put_definition(out, body.user)
+
+    def _encode_left(self, out, body):
+        self._put_user(out, body.user)
+        index = self.uids.pop(body.user, None)
+        if index is not None:
+            heapq.heappush(self.free, index)
+
+    def _encode_challenged(self, out, body):
+        self._put_user(out, body.user)
+        _put_uint(out, len(body.contenders))
+        for user in body.contenders:
+            self._put_user(out, user)
+
+    def _encode_reply(self, out, body):
+        _put_uint(out, len(body.answers))
+        for answer in body.answers:
+            _put_str(out, answer)
+        _put_uint(out, body.timeout)
+
+    def _encode_lost(self, out, body):
+        self._put_user(out, body.user)
+        _put_opt_str(out, body.reason)
+
+    def _encode_end(self, out, body):
+        self._put_user(out, body.winner)
+        _put_uint(out, body.answer)
+
+    def _put_definition(self, out, user):
+        index = self.uids.get(user)
+        if index is None:
+            index = self.uids[user] = heapq.heappop(self.free) if self.free else len(self.uids)
+        _put_uint(out, index)
+        _put_str(out, user)
+
+    def _put_user(self, out, user):
+        if user is None:
+            out.append(0)
+        elif user in self.uids:
+            _put_uint(out, self.uids[user] + 2)
+        else:
+            out.append(1)
+            _put_str(out, user)
+
+
+def encode_batch(events):
+    out = bytearray([BATCH])
+    _put_uint(out, len(events))
+    for event in events:
+        out += event
+    return bytes(out)
+
+
+def decode_request(data):
+    if data[:1] == bytes([CHALLENGE]):
+        return Request(action='challenge')
+    if data[:1] == bytes([ANSWER]):
+        answer, _ = _get_uint(data, 1)
+        return Request(answer=answer)
+    raise ValueError(f'Unknown request: {data!r}')
+
+
+def _put_uint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _put_str(out, text):
+    data = text.encode()
+    _put_uint(out, len(data))
+    out += data
+
+
+def _put_opt_str(out, text):
+    if text is None:
+        out.append(0)
+    else:
+        data = text.encode()
+        _put_uint(out, len(data) + 1)
+        out += data
+
+
+def _get_uint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
@@ -5,9 +5,56 @@ env.read_env()
 
 port = env.int('PORT')
 log_level = env('LOG_LEVEL')
+log_format = env('LOG_FORMAT', 'text')
+log_sampling = {category: float(rate) for category, rate in env.dict('LOG_SAMPLING', {}).items()}
+use_uvloop = env.bool('USE_UVLOOP', False)
 challenge_timeout_seconds = env.int('CHALLENGE_TIMEOUT_SECONDS')
+challenge_window_seconds = env.float('CHALLENGE_WINDOW_SECONDS', 0.1)
+challenge_rtt_compensation = env.bool('CHALLENGE_RTT_COMPENSATION', False)
 max_sockets = env.int('MAX_SOCKETS')
+max_rooms = env.int('MAX_ROOMS', 1000)
+workers = env.int('WORKERS', 1)
+worker_port_base = env.int('WORKER_PORT_BASE', port + 1)
+cluster_socket = env('CLUSTER_SOCKET', '/tmp/conductor.sock')
+outbound_queue_size = env.int('OUTBOUND_QUEUE_SIZE', 64)
+outbound_overflow_policy = env('OUTBOUND_OVERFLOW_POLICY', 'drop_oldest')
+heartbeat_interval_seconds = env.float('HEARTBEAT_INTERVAL_SECONDS', 15)
+heartbeat_timeout_seconds = env.float('HEARTBEAT_TIMEOUT_SECONDS', 10)
+idle_timeout_seconds = env.float('IDLE_TIMEOUT_SECONDS', 0)
+resume_grace_seconds = env.float('RESUME_GRACE_SECONDS', 10)
+event_log_size = env.int('EVENT_LOG_SIZE', 64)
+coalesce_events = env.bool('COALESCE_EVENTS', False)
+coalesce_seconds = env.float('COALESCE_SECONDS', 0)
+lobby_size = env.int('LOBBY_SIZE', 1000)
+request_limits = {
+    kind: tuple(float(value) for value in limit.split(':'))
+    for kind, limit in env.dict('REQUEST_LIMITS', {'challenge': '2:5', 'answer': '2:5', 'other': '1:5'}).items()
+}
+max_request_violations = env.int('MAX_REQUEST_VIOLATIONS', 50)
+request_violation_window_seconds = env.float('REQUEST_VIOLATION_WINDOW_SECONDS', 60)
+connection_rate = env.float('CONNECTION_RATE', 0)
+connection_burst = env.int('CONNECTION_BURST', 20)
+client_address_header = env('CLIENT_ADDRESS_HEADER', None)
 seconds_before_new_session = env.int('SECONDS_BEFORE_NEW_SESSION')
 static_files_path = env('STATIC_FILES_PATH', None)
 trivia_max_fetch_tentatives = env.int('TRIVIA_MAX_FETCH_TENTATIVES')
-trivia_fetch_size = env.int('TRIVIA_FETCH_SIZE')
\ No newline at end of file
+trivia_fetch_size = env.int('TRIVIA_FETCH_SIZE')
+trivia_refill_watermark = env.int('TRIVIA_REFILL_WATERMARK', 5)
+trivia_retry_backoff_seconds = env.float('TRIVIA_RETRY_BACKOFF_SECONDS', 1)
+trivia_max_connections = env.int('TRIVIA_MAX_CONNECTIONS', 4)
+trivia_keepalive_seconds = env.float('TRIVIA_KEEPALIVE_SECONDS', 30)
+trivia_dns_cache_seconds = env.int('TRIVIA_DNS_CACHE_SECONDS', 300)
+trivia_connect_timeout_seconds = env.float('TRIVIA_CONNECT_TIMEOUT_SECONDS', 3)
+trivia_read_timeout_seconds = env.float('TRIVIA_READ_TIMEOUT_SECONDS', 5)
+trivia_breaker_threshold = env.int('TRIVIA_BREAKER_THRESHOLD', 5)
+trivia_breaker_reset_seconds = env.float('TRIVIA_BREAKER_RESET_SECONDS', 30)
+quiz_source_type = env('QUIZ_SOURCE', 'opentrivia')
+quiz_bank_path = env('QUIZ_BANK_PATH', None)
+seen_questions_capacity = env.int('SEEN_QUESTIONS_CAPACITY', 10000)
+seen_questions_path = env('SEEN_QUESTIONS_PATH', None)
+session_snapshot_path = env('SESSION_SNAPSHOT_PATH', None)
+session_snapshot_max_age_seconds = env.float('SESSION_SNAPSHOT_MAX_AGE_SECONDS', 30)
+results_path = env('RESULTS_PATH', None)
+results_batch_size = env.int('RESULTS_BATCH_SIZE', 100)
+results_flush_seconds = env.float('RESULTS_FLUSH_SECONDS', 1)
+leaderboard_size = env.int('LEADERBOARD_SIZE', 10)
@@ -1,23 +1,44 @@
 import asyncio
 
-from conductor import messages
+from conductor import messages, metrics
+from conductor.clock import Clock
+from conductor.results import round_result
+
+active_sessions = metrics.gauge('conductor_sessions', 'Game sessions in progress')
+challenge_seconds = metrics.histogram('conductor_challenge_seconds', 'Time spent handling a challenge')
+round_seconds = metrics.histogram('conductor_round_seconds', 'Time between the start of two sessions',
+                                  buckets=(1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300, 600))
 
 
 class Session:
     def __init__(self, quiz):
         self.quiz = quiz
-        self.users = set()
-        self.dead_users = set()
+        self.users = {}
+        self.dead_users = {}
         self.challenging = None
+        self.snapshot_frame = None
+
+    def snapshot(self):
+        if not self.snapshot_frame:
+            self.snapshot_frame = messages.encode_snapshot(
+                question=self.quiz.question,
+                users=self.users,
+                lost=self.dead_users,
+                challenged=self.challenging
+            )
+        return self.snapshot_frame
 
     def add_user(self, user):
-        self.users.add(user)
+        self.users[user] = messages.dumps(user)
+        self.snapshot_frame = None
 
     def remove_user(self, user):
-        self.users.remove(user)
+        del self.users[user]
+        self.snapshot_frame = None
 
     def kill_user(self, user):
-        self.dead_users.add(user)
+        self.dead_users[user] = messages.dumps(user)
+        self.snapshot_frame = None
 
     def is_user_present(self, user):
         return user in self.users
@@ -33,14 +54,47 @@ class Session:
 
     def begin_challenge(self, user):
         self.challenging = user
+        self.snapshot_frame = None
 
     def end_challenge(self):
         self.challenging = None
+        self.snapshot_frame = None
+
+    def to_json(self):
+        return {
+            'quiz': dict(self.quiz),
+            'users': list(self.users),
+            'lost': list(self.dead_users),
+            'challenged': self.challenging
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        from box import Box
+
+        session = cls(Box(data['quiz']))
+        session.users = {user: messages.dumps(user) for user in data['users']}
+        session.dead_users = {user: messages.dumps(user) for user in data['lost']}
+        return session
 
     def new_quiz(self, quiz):
         self.quiz = quiz
         self.challenging = None
-        self.dead_users = set()
+        self.dead_users = {}
+        self.snapshot_frame = None
+
+
+class Arbitration:
+    def __init__(self):
+        self.requests = {}
+        self.decided = asyncio.get_event_loop().create_future()
+
+    def add(self, user, received_at):
+        self.requests.setdefault(user, received_at)
+
+    def decide(self):
+        contenders = sorted(self.requests, key=self.requests.get)
+        self.decided.set_result(contenders)
 
 
 class Conductor:
@@ -48,54 +102,112 @@ class Conductor:
                  quiz_source,
                  challenge_timeout_seconds,
                  seconds_before_new_session,
+                 clock=Clock(),
+                 challenge_window_seconds=0,
+                 rtt_compensation=False,
+                 results=None,
+                 room=None,
                  ):
         self.quiz_source = quiz_source
         self.challenge_timeout_seconds = challenge_timeout_seconds
         self.seconds_before_new_session = seconds_before_new_session
+        self.clock = clock
+        self.challenge_window_seconds = challenge_window_seconds
+        self.rtt_compensation = rtt_compensation
+        self.results = results
+        self.room = room
+        self.losses = {}
+        self.answer_seconds = None
         self.session = None
+        self.arbitration = None
+        self.session_started_at = None
 
     async def new_session(self):
         quiz = await self.quiz_source.next()
+        now = self.clock.time()
+        if self.session_started_at is not None:
+            round_seconds.observe(now - self.session_started_at)
+        self.session_started_at = now
+        self.losses = {}
+        self.answer_seconds = None
         if self.session:
             self.session.new_quiz(quiz)
         else:
             self.session = Session(quiz)
+            active_sessions.inc()
+
+    def close(self):
+        if self.session:
+            self.session = None
+            active_sessions.dec()
+
+    def snapshot(self):
+        return self.session.to_json() if self.session else None
+
+    def restore(self, data):
+        if data and not self.session:
+            self.session = Session.from_json(data)
+            active_sessions.inc()
 
     async def on_enter(self, network, user):
         if not self.session:
             await self.new_session()
-        await network.send(user, messages.question(self.session.quiz.question))
-        await self._replay_events(network, user)
+        await network.send(user, self.session.snapshot())
         await network.publish(messages.joined(user))
         self.session.add_user(user)
 
+    async def on_resume(self, network, user):
+        await network.send(user, self.session.snapshot())
+
+    def accepts(self, user, kind):
+        if kind != 'challenge' or not self.session:
+            return True
+        return not self.session.is_challenging() and self.session.is_user_alive(user)
+
     async def on_message(self, network, message):
         if not self.session.is_user_alive(message.user):
             return
         if messages.is_challenge_request(message) and not self.session.is_challenging():
-            return await self._handle_challenge(network, message.user)
-
-    async def _replay_events(self, network, user):
-        for other_user in self.session.users:
-            await network.send(user, messages.joined(other_user))
-            if not self.session.is_user_alive(other_user):
-                await network.send(user, messages.lost(other_user))
-        if not self.session.is_user_alive(user):
-            await network.send(user, messages.lost(user))
-        if self.session.challenging:
-            await network.send(user, messages.challenged(self.session.challenging))
-
-    async def _handle_challenge(self, network, user):
+            contenders = await self._arbitrate(network, message)
+            if contenders and contenders[0] == message.user and not self.session.is_challenging():
+                return await self._handle_challenge(network, message.user, contenders)
+
+    async def _arbitrate(self, network, message):
+        if not self.challenge_window_seconds:
+            return [message.user]
+        received_at = self.clock.time() if message.received_at is None else message.received_at
+        if self.rtt_compensation:
+            received_at -= min(network.rtt(message.user) / 2, self.challenge_window_seconds)
+        arbitration = self.arbitration
+        if arbitration:
+            arbitration.add(message.user, received_at)
+            return await asyncio.shield(arbitration.decided)
+        arbitration = self.arbitration = Arbitration()
+        arbitration.add(message.user, received_at)
+        try:
+            await self.clock.sleep(self.challenge_window_seconds)
+        finally:
+            self.arbitration = None
+            arbitration.decide()
+        return arbitration.decided.result()
+
+    async def _handle_challenge(self, network, user, contenders):
+        with challenge_seconds.time():
+            await self._run_challenge(network, user, contenders)
+
+    async def _run_challenge(self, network, user, contenders):
         try:
             self.session.begin_challenge(user)
             await network.send(user, messages.reply(self.session.quiz.answers, self.challenge_timeout_seconds))
-            await network.publish(messages.challenged(user))
+            await network.publish(messages.challenged(user, contenders))
             try:
+                started_at = self.clock.time()
                 answer = await network.receive(user, timeout=self.challenge_timeout_seconds)
+                self.answer_seconds = self.clock.time() - started_at
                 await self._handle_answer(network, answer)
             except asyncio.TimeoutError:
                 await self._handle_bad_answer(network, user, reason='timeout')
-            except:
+            except Exception:
                 await self._handle_bad_answer(network, user, reason=None)
         finally:
             self.session.end_challenge()
@@ -112,13 +224,17 @@ class Conductor:
 
     async def _handle_bad_answer(self, network, user, reason):
         self.session.kill_user(user)
+        self.losses[user] = reason
         await network.publish(messages.lost(user, reason))
         if not self.session.is_any_user_alive():
             await self._end_game(network, winner=None)
 
     async def _end_game(self, network, winner):
         await network.publish(messages.end(winner, answer=self.session.quiz.answer))
-        await asyncio.sleep(self.seconds_before_new_session)
+        if self.results:
+            self.results.record(round_result(self.room, self.session.quiz.question, winner, self.losses,
+                                             self.answer_seconds if winner else None))
+        await self.clock.sleep(self.seconds_before_new_session)
         await self.new_session()
         await network.publish(messages.question(self.session.quiz.question))
 
@@ -0,0 +1,36 @@
+import json
+import logging
+import os
+import time
+
+from conductor import metrics
+
+snapshot_seconds = metrics.histogram('conductor_handoff_snapshot_seconds', 'Time spent saving sessions at shutdown')
+restore_seconds = metrics.histogram('conductor_handoff_restore_seconds', 'Time spent restoring sessions at startup')
+
+
+def save(path, rooms):
+    with snapshot_seconds.time():
+        state = rooms.snapshot()
+        state['saved_at'] = time.time()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as fp:
+            json.dump(state, fp, separators=(',', ':'))
+        os.replace(temporary, path)
+    logging.info('%s: saved %s rooms', path, len(state['rooms']))
+
+
+def restore(path, rooms, max_age_seconds):
+    if not os.path.exists(path):
+        return 0
+    with restore_seconds.time():
+        with open(path, encoding='utf-8') as fp:
+            state = json.load(fp)
+        os.unlink(path)
+        age = time.time() - state['saved_at']
+        if age > max_age_seconds:
+            logging.warning('%s: sessions saved %.0fs ago are too old, skipping them', path, age)
+            return 0
+        restored = rooms.restore(state)
+    logging.info('%s: restored %s rooms', path, restored)
+    return restored
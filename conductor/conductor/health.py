@@ -0,0 +1,46 @@
+import logging
+import time
+
+from aiohttp import web
+
+from conductor import metrics
+
+started_at = time.monotonic()
+
+startup_seconds = metrics.gauge('conductor_startup_seconds', 'Time from loading the server to being ready')
+first_connection_seconds = metrics.gauge('conductor_first_connection_seconds',
+                                         'Time from loading the server to the first accepted connection')
+
+
+class Health:
+    def __init__(self, started=None):
+        self.started_at = started_at if started is None else started
+        self.ready = False
+        self.connected = False
+
+    def set_ready(self, ready=True):
+        if ready and not self.ready:
+            startup_seconds.set(time.monotonic() - self.started_at)
+        self.ready = ready
+
+    async def warm_up(self, warming):
+        try:
+            await warming
+        except Exception:
+            logging.exception('cannot warm up, serving anyway')
+        self.set_ready()
+
+    async def liveness(self, _request):
+        return web.Response(text='ok')
+
+    async def readiness(self, _request):
+        if not self.ready:
+            raise web.HTTPServiceUnavailable(text='not ready')
+        return web.Response(text='ok')
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if not self.connected and request.path == '/play':
+            self.connected = True
+            first_connection_seconds.set(time.monotonic() - self.started_at)
+        return await handler(request)
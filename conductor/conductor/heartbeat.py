@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import math
+
+from conductor import metrics
+from conductor.clock import Clock
+
+RTT_WEIGHT = 0.25
+
+evictions = metrics.counter('conductor_evicted_sockets_total', 'Sockets closed by the heartbeat by reason',
+                            label='reason')
+
+
+class TimerWheel:
+    def __init__(self, slots):
+        self.slots = [{} for _ in range(slots)]
+        self.deadlines = {}
+        self.tick = 0
+
+    def schedule(self, key, ticks):
+        self.cancel(key)
+        deadline = self.tick + max(1, ticks)
+        self.deadlines[key] = deadline
+        self.slots[deadline % len(self.slots)][key] = deadline
+
+    def cancel(self, key):
+        deadline = self.deadlines.pop(key, None)
+        if deadline is not None:
+            del self.slots[deadline % len(self.slots)][key]
+
+    def advance(self):
+        self.tick += 1
+        slot = self.slots[self.tick % len(self.slots)]
+        expired = [key for key, deadline in slot.items() if deadline <= self.tick]
+        for key in expired:
+            del slot[key]
+            del self.deadlines[key]
+        return expired
+
+    def __len__(self):
+        return len(self.deadlines)
+
+
+class Peer:
+    __slots__ = ('seen_at', 'active_at', 'pinged_at', 'rtt')
+
+    def __init__(self, now):
+        self.seen_at = now
+        self.active_at = now
+        self.pinged_at = None
+        self.rtt = None
+
+
+class Heartbeat:
+    def __init__(self, interval_seconds, timeout_seconds, idle_timeout_seconds=0, tick_seconds=1, clock=Clock()):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        self.wheel = TimerWheel(self._ticks(max(interval_seconds, timeout_seconds)) + 1)
+        self.peers = {}
+        self.task = None
+
+    def _ticks(self, seconds):
+        return math.ceil(seconds / self.tick_seconds)
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await self.clock.sleep(self.tick_seconds)
+            for ws in self.wheel.advance():
+                self._expire(ws)
+
+    def watch(self, ws):
+        self.peers[ws] = Peer(self.clock.time())
+        self.wheel.schedule(ws, self._ticks(self.interval_seconds))
+
+    def unwatch(self, ws):
+        self.peers.pop(ws, None)
+        self.wheel.cancel(ws)
+
+    def touch(self, ws, active=False):
+        peer = self.peers.get(ws)
+        if peer:
+            peer.seen_at = self.clock.time()
+            if active:
+                peer.active_at = peer.seen_at
+
+    def pong(self, ws):
+        peer = self.peers.get(ws)
+        if peer and peer.pinged_at is not None:
+            rtt = self.clock.time() - peer.pinged_at
+            peer.rtt = rtt if peer.rtt is None else peer.rtt * (1 - RTT_WEIGHT) + rtt * RTT_WEIGHT
+
+    def rtt(self, ws):
+        peer = self.peers.get(ws)
+        return peer.rtt or 0 if peer else 0
+
+    def _expire(self, ws):
+        peer = self.peers[ws]
+        now = self.clock.time()
+        if self.idle_timeout_seconds and now - peer.active_at >= self.idle_timeout_seconds:
+            return self._evict(ws, 'idleTimeout')
+        if peer.pinged_at is None:
+            peer.pinged_at = now
+            asyncio.ensure_future(self._ping(ws))
+            return self.wheel.schedule(ws, self._ticks(self.timeout_seconds))
+        if peer.seen_at < peer.pinged_at:
+            return self._evict(ws, 'heartbeatTimeout')
+        peer.pinged_at = None
+        self.wheel.schedule(ws, self._ticks(self.interval_seconds - self.timeout_seconds))
+
+    async def _ping(self, ws):
+        try:
+            await ws.ping()
+        except ConnectionError:
+            logging.debug('socket gone, cannot ping')
+
+    def _evict(self, ws, reason):
+        logging.info('closing socket: %s', reason)
+        evictions.inc(reason)
+        self.unwatch(ws)
+        asyncio.ensure_future(ws.close())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
@@ -0,0 +1,96 @@
+import asyncio
+from collections import deque
+import logging
+import math
+
+from conductor import messages, metrics
+from conductor.outbox import COALESCE, Outbox
+
+waiting_players = metrics.gauge('conductor_lobby_players', 'Players waiting in the lobby')
+lobby_seconds = metrics.histogram('conductor_lobby_seconds', 'Time spent in the lobby by admitted players')
+
+
+class Waiter:
+    __slots__ = ('ws', 'room_id', 'outbox', 'admitted', 'since')
+
+    def __init__(self, ws, room_id, since):
+        self.ws = ws
+        self.room_id = room_id
+        self.outbox = Outbox(ws, size=1, overflow_policy=COALESCE)
+        self.admitted = asyncio.get_event_loop().create_future()
+        self.since = since
+
+
+class Lobby:
+    def __init__(self, max_size, round_seconds, default_round_seconds=30):
+        self.max_size = max_size
+        self.round_seconds = round_seconds
+        self.default_round_seconds = default_round_seconds
+        self.waiters = deque()
+
+    def is_full(self):
+        return len(self.waiters) >= self.max_size
+
+    def is_empty(self):
+        return len(self.waiters) == 0
+
+    async def wait(self, ws, room_id, place):
+        loop = asyncio.get_event_loop()
+        waiter = Waiter(ws, room_id, loop.time())
+        self.waiters.append(waiter)
+        waiting_players.inc()
+        self._notify()
+        self.admit(place)
+        leaving = asyncio.ensure_future(self._watch_leave(ws))
+        try:
+            await asyncio.wait([waiter.admitted, leaving], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            if waiter.admitted.done() and not waiter.admitted.cancelled():
+                waiter.admitted.result().pending -= 1
+            raise
+        finally:
+            leaving.cancel()
+            waiter.outbox.close()
+            self._remove(waiter)
+        if waiter.admitted.done() and not waiter.admitted.cancelled():
+            lobby_seconds.observe(loop.time() - waiter.since)
+            return waiter.admitted.result()
+        logging.debug('left the lobby while waiting')
+        return None
+
+    async def _watch_leave(self, ws):
+        async for _msg in ws:
+            pass
+
+    def admit(self, place):
+        admitted = False
+        for waiter in list(self.waiters):
+            room = place(waiter.room_id)
+            if room:
+                room.pending += 1
+                self._remove(waiter, notify=False)
+                waiter.admitted.set_result(room)
+                admitted = True
+        if admitted:
+            self._notify()
+
+    def _remove(self, waiter, notify=True):
+        if waiter in self.waiters:
+            self.waiters.remove(waiter)
+            waiting_players.dec()
+            if notify:
+                self._notify()
+
+    def _notify(self):
+        round_seconds = self._mean_round_seconds()
+        for position, waiter in enumerate(self.waiters, 1):
+            waiter.outbox.put(messages.encode(messages.queued(position, math.ceil(position * round_seconds))))
+
+    def _mean_round_seconds(self):
+        if not self.round_seconds.count:
+            return self.default_round_seconds
+        return self.round_seconds.sum / self.round_seconds.count
+
+    def close(self):
+        for waiter in list(self.waiters):
+            waiter.admitted.cancel()
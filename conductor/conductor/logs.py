@@ -0,0 +1,105 @@
+import atexit
+from contextvars import ContextVar
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+
+TEXT = 'text'
+JSON = 'json'
+FORMATS = (TEXT, JSON)
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(room)s %(uid)s] %(message)s'
+
+room = ContextVar('room', default=None)
+uid = ContextVar('uid', default=None)
+
+frames = logging.getLogger('conductor.frames')
+
+
+def bind(room_id=None, user=None):
+    if room_id is not None:
+        room.set(room_id)
+    if user is not None:
+        uid.set(user)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.room = room.get()
+        record.uid = uid.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates, random_source=random.random):
+        super().__init__()
+        self.rates = rates
+        self.random = random_source
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rates.get(record.name.rpartition('.')[2], 1)
+        return rate >= 1 or self.random() < rate
+
+
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'room': getattr(record, 'room', None),
+            'uid': getattr(record, 'uid', None),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def setup(level, log_format=TEXT, sampling=None):
+    if log_format not in FORMATS:
+        raise ValueError(f'Unknown log format: {log_format}')
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if log_format == JSON else logging.Formatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    handler = RecordQueueHandler(records)
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+    handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener = QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def stop(listener):
+    atexit.unregister(listener.stop)
+    listener.stop()
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+    for output in listener.handlers:
+        output.addFilter(ContextFilter())
+        root.addHandler(output)
@@ -1,4 +1,147 @@
-from box import Box
+import json
+
+from conductor import metrics
+
+encode_seconds = metrics.histogram('conductor_message_encode_seconds', 'Time spent encoding messages to frames')
+
+dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class Frame(str):
+    key = None
+    body = None
+    binary = None
+    seq = None
+    frames = None
+
+
+class Model:
+    __slots__ = ()
+    fields = ()
+
+    def __init__(self, *args, **kwargs):
+        for field, value in zip(self.fields, args):
+            setattr(self, field, value)
+        for field in self.fields[len(args):]:
+            setattr(self, field, kwargs.pop(field, None))
+        if kwargs:
+            raise TypeError(f'Unknown fields: {", ".join(kwargs)}')
+
+    def to_json(self):
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.fields)
+
+    def __repr__(self):
+        values = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.fields)
+        return f'{type(self).__name__}({values})'
+
+
+class Event(Model):
+    __slots__ = ()
+    event = None
+
+    def to_json(self):
+        data = {'event': self.event}
+        for field in self.fields:
+            data[field] = getattr(self, field)
+        return data
+
+
+class Question(Event):
+    __slots__ = fields = ('question',)
+    event = 'question'
+
+
+class Snapshot(Event):
+    __slots__ = fields = ('question', 'users', 'lost', 'challenged')
+    event = 'snapshot'
+
+
+class Joined(Event):
+    __slots__ = fields = ('user',)
+    event = 'joined'
+
+
+class Left(Event):
+    __slots__ = fields = ('user',)
+    event = 'left'
+
+
+class Challenged(Event):
+    __slots__ = fields = ('user', 'contenders')
+    event = 'challenged'
+
+
+class Reply(Event):
+    __slots__ = fields = ('answers', 'timeout')
+    event = 'reply'
+
+
+class Lost(Event):
+    __slots__ = fields = ('user', 'reason')
+    event = 'lost'
+
+
+class End(Event):
+    __slots__ = fields = ('winner', 'answer')
+    event = 'end'
+
+
+class Queued(Event):
+    __slots__ = fields = ('position', 'wait')
+    event = 'queued'
+
+
+class Request(Model):
+    __slots__ = fields = ('action', 'answer')
+
+    def to_json(self):
+        return {field: getattr(self, field) for field in self.fields if getattr(self, field) is not None}
+
+    @classmethod
+    def parse(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError(f'Request is not an object: {data!r}')
+        action = data.get('action')
+        answer = data.get('answer')
+        if action is not None and action != 'challenge':
+            raise ValueError(f'Unknown action: {action!r}')
+        if answer is not None and (type(answer) is not int or answer < 0):
+            raise ValueError(f'Invalid answer: {answer!r}')
+        return cls(action, answer)
+
+
+def encode(body, seq=None):
+    if isinstance(body, Frame):
+        if seq is None:
+            return body
+        body = body.body
+    with encode_seconds.time():
+        data = body.to_json() if isinstance(body, Model) else dict(body)
+        if seq is not None:
+            data['seq'] = seq
+        frame = Frame(dumps(data))
+    frame.key = data.get('event')
+    frame.body = body
+    frame.seq = seq
+    return frame
+
+
+def encode_snapshot(question, users, lost, challenged):
+    with encode_seconds.time():
+        frame = Frame(f'{{"event":"snapshot","question":{dumps(question)},"users":[{",".join(users.values())}],'
+                      f'"lost":[{",".join(lost.values())}],"challenged":{dumps(challenged)}}}')
+    frame.key = Snapshot.event
+    frame.body = Snapshot(question, list(users), list(lost), challenged)
+    return frame
+
+
+def encode_batch(frames):
+    frame = Frame(f'[{",".join(frames)}]')
+    frame.frames = frames
+    return frame
 
 
 def is_challenge_request(message):
@@ -6,28 +149,36 @@ def is_challenge_request(message):
 
 
 def question(text):
-    return Box(event='question', question=text)
+    return Question(text)
+
+
+def snapshot(question, users, lost, challenged):
+    return Snapshot(question, users, lost, challenged)
 
 
 def joined(user):
-    return Box(event='joined', user=user)
+    return Joined(user)
 
 
 def left(user):
-    return Box(event='left', user=user)
+    return Left(user)
 
 
-def challenged(user):
-    return Box(event='challenged', user=user)
+def challenged(user, contenders=None):
+    return Challenged(user, contenders or [user])
 
 
 def reply(answers, timeout):
-    return Box(event='reply', answers=answers, timeout=timeout)
+    return Reply(answers, timeout)
 
 
 def lost(user, reason=None):
-    return Box(event='lost', user=user, reason=reason)
+    return Lost(user, reason)
 
 
 def end(winner, answer):
-    return Box(event='end', winner=winner, answer=answer)
+    return End(winner, answer)
+
+
+def queued(position, wait):
+    return Queued(position, wait)
@@ -0,0 +1,118 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import time
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1,
+                   2.5, 5, 10)
+SIZE_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+registry = {}
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, '', self.value
+
+
+class LabeledCounter:
+    type = 'counter'
+
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.values = {}
+
+    def inc(self, label_value, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        for label_value, value in sorted(self.values.items()):
+            yield self.name, f'{{{self.label}="{label_value}"}}', value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket', f'{{le="{bound}"}}', cumulative
+        yield f'{self.name}_bucket', '{le="+Inf"}', self.count
+        yield f'{self.name}_sum', '', self.sum
+        yield f'{self.name}_count', '', self.count
+
+
+def counter(name, description, label=None):
+    if label:
+        return _register(LabeledCounter(name, description, label))
+    return _register(Counter(name, description))
+
+
+def gauge(name, description):
+    return _register(Gauge(name, description))
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, description, buckets))
+
+
+def _register(metric):
+    return registry.setdefault(metric.name, metric)
+
+
+def render():
+    lines = []
+    for metric in registry.values():
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+async def handler(_request):
+    return web.Response(text=render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
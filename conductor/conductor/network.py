@@ -1,96 +1,325 @@
 import asyncio
-from collections import namedtuple
+from collections import deque, namedtuple
 import logging
+import secrets
 
-from aiohttp import WSMsgType, web
-from box import Box
-from cerberus import Validator
+from aiohttp import WSCloseCode, WSMsgType, web
 
-Message = namedtuple('Message', ['user', 'body'])
+from conductor import codec, logs, messages, metrics
+from conductor.clock import Clock
+from conductor.ratelimit import RequestLimiter
+from conductor.validation import compile_schema
+
+publish_seconds = metrics.histogram('conductor_publish_seconds', 'Time spent fanning out a published event')
+resumes = metrics.counter('conductor_resumes_total', 'Resumed sessions by outcome', label='outcome')
+dropped_requests = metrics.counter('conductor_dropped_requests_total', 'Requests dropped before decoding by reason',
+                                   label='reason')
+abusive_sockets = metrics.counter('conductor_abusive_sockets_total', 'Sockets closed for exceeding request limits')
+
+Message = namedtuple('Message', ['user', 'body', 'received_at'], defaults=[None])
 
 
 async def noop(*_args):
     pass
 
 
+def accept_all(*_args):
+    return True
+
+
+def request_kind(msg):
+    if msg.type == WSMsgType.binary:
+        return 'challenge' if msg.data[:1] == bytes([codec.CHALLENGE]) else 'answer'
+    if '"challenge"' in msg.data:
+        return 'challenge'
+    if '"answer"' in msg.data:
+        return 'answer'
+    return 'other'
+
+
+async def prepare_websocket(request):
+    ws = web.WebSocketResponse(autoping=False)
+    ws_ready = ws.can_prepare(request)
+    if not ws_ready.ok:
+        raise web.HTTPMethodNotAllowed()
+    await ws.prepare(request)
+    return ws
+
+
 class Network:
     request_schema = {
         'uid': {
             'type': 'string',
             'empty': False
+        },
+        'encoding': {
+            'type': 'string',
+            'allowed': codec.ENCODINGS
+        },
+        'token': {
+            'type': 'string',
+            'empty': False
+        },
+        'seq': {
+            'type': 'string',
+            'regex': '[0-9]+'
         }
     }
+    validate_query = staticmethod(compile_schema(request_schema))
 
-    def __init__(self, registry, on_enter=noop, on_message=noop, on_exit=noop):
+    def __init__(self, registry, on_enter=noop, on_message=noop, on_exit=noop, on_resume=noop, on_expired=noop,
+                 accepts=accept_all, room=None, clock=Clock(), heartbeat=None, resume_grace_seconds=0,
+                 event_log_size=64, request_limits=None, max_violations=0, violation_window_seconds=60,
+                 coalesce_seconds=None):
         self.registry = registry
         self.on_enter = on_enter
         self.on_message = on_message
         self.on_exit = on_exit
+        self.on_resume = on_resume
+        self.on_expired = on_expired
+        self.accepts = accepts
+        self.room = room
+        self.clock = clock
+        self.heartbeat = heartbeat
+        self.resume_grace_seconds = resume_grace_seconds
+        self.request_limits = request_limits
+        self.max_violations = max_violations
+        self.violation_window_seconds = violation_window_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self.batch = []
+        self.flushing = None
+        self.codec = codec.BinaryCodec()
+        self.seats = {}
+        self.log = deque(maxlen=event_log_size)
+        self.seq = 0
+        self.closing = False
 
     async def __call__(self, request):
-        user = self._read_user(request)
-        ws = web.WebSocketResponse()
-        ws_ready = ws.can_prepare(request)
-        if not ws_ready.ok:
-            raise web.HTTPMethodNotAllowed()
-        await ws.prepare(request)
-        error = self.registry.register(ws, user)
+        query = self._read_query(request)
+        ws = await prepare_websocket(request)
+        return await self.serve(ws, query['uid'], query.get('encoding', codec.JSON), query.get('token'),
+                                query.get('seq'))
+
+    async def serve(self, ws, user, encoding=codec.JSON, token=None, seq=None):
+        logs.bind(self.room, user)
+        self._flush()
+        seat = self.seats.get(user)
+        if seat and token == seat.token and user in self.registry.sockets:
+            await self._take_over(user, seat)
+            seat = self.seats.get(user)
+        resume = seat is not None and token == seat.token
+        error = self.registry.register(ws, user, binary=encoding == codec.BINARY, resume=resume)
         if error:
-            await ws.send_json(Box(event='rejected', reason=error))
+            await ws.send_json({'event': 'rejected', 'reason': error})
             return ws
-        await ws.send_json(Box(event='ready'))
-        await self.on_enter(self, user)
+        if self.heartbeat:
+            self.heartbeat.watch(ws)
+        if resume:
+            seat.expiry.cancel()
+            await ws.send_json(self._ready_event(seat))
+            await self._replay(user, seat, seq)
+        else:
+            seat = self.seats[user] = Seat()
+            await ws.send_json(self._ready_event(seat))
+            await self.on_enter(self, user)
+        left = True
         try:
-            await self._listen_messages(user, ws)
+            left = await self._listen_messages(user, ws)
         finally:
-            self.registry.unregister(user)
-            await self.on_exit(self, user)
+            if self.heartbeat:
+                self.heartbeat.unwatch(ws)
+            if self.closing:
+                self.registry.unregister(user)
+            elif left or not self.resume_grace_seconds:
+                self.registry.unregister(user)
+                await self._exit(user, seat)
+            else:
+                self._suspend(user, seat)
         return ws
 
-    def _read_user(self, request):
-        query = Box(request.query)
-        validator = Validator(self.request_schema)
-        if not validator.validate(query):
+    def _ready_event(self, seat):
+        event = {'event': 'ready', 'token': seat.token, 'seq': self.seq}
+        if self.room is not None:
+            event['room'] = self.room
+        return event
+
+    async def _take_over(self, user, seat):
+        logging.debug('%s: replacing stale socket', user)
+        seat.detached.clear()
+        await self.registry.sockets[user].close()
+        await seat.detached.wait()
+
+    def _suspend(self, user, seat):
+        self.registry.suspend(user)
+        seat.expiry = asyncio.ensure_future(self._expire(user, seat))
+        seat.detached.set()
+
+    async def _expire(self, user, seat):
+        await self.clock.sleep(self.resume_grace_seconds)
+        resumes.inc('expired')
+        self.registry.release(user)
+        await self._exit(user, seat)
+        await self.on_expired(self, user)
+
+    async def _exit(self, user, seat):
+        if self.seats.get(user) is seat:
+            del self.seats[user]
+        seat.detached.set()
+        await self.on_exit(self, user)
+
+    async def _replay(self, user, seat, seq):
+        seq = None if seq is None else int(seq)
+        restored, seat.restored = seat.restored, False
+        if not restored and seq is not None and seq >= self.seq - len(self.log):
+            resumes.inc('replayed')
+            outbox = self.registry.outboxes[user]
+            for frame in self.log:
+                if frame.seq > seq:
+                    self._put(outbox, frame)
+        else:
+            resumes.inc('snapshot')
+            await self.on_resume(self, user)
+
+    def _read_query(self, request):
+        query = dict(request.query)
+        if not self.validate_query(query):
             raise web.HTTPBadRequest()
-        return query.uid
+        return query
 
-    async def _listen_messages(self, user, ws):
+    async def _receive(self, ws):
         while True:
             msg = await ws.receive()
-            logging.debug('%s: received %s', user, msg)
-            if msg.type == WSMsgType.text:
-                await self._handle_message(user, msg)
+            if self.heartbeat:
+                self.heartbeat.touch(ws, active=msg.type in (WSMsgType.text, WSMsgType.binary))
+            if msg.type == WSMsgType.PING:
+                await ws.pong(msg.data)
+            elif msg.type == WSMsgType.PONG and self.heartbeat:
+                self.heartbeat.pong(ws)
+            elif msg.type != WSMsgType.PONG:
+                return msg
+
+    async def _listen_messages(self, user, ws):
+        limiter = RequestLimiter(self.request_limits, self.clock, self.violation_window_seconds) \
+            if self.request_limits else None
+        while True:
+            msg = await self._receive(ws)
+            logs.frames.debug('received %s frame', msg.type.name)
+            if msg.type in (WSMsgType.text, WSMsgType.binary):
+                kind = request_kind(msg)
+                if limiter and not limiter.allow(kind):
+                    dropped_requests.inc('rateLimited')
+                    if self.max_violations and limiter.violations >= self.max_violations:
+                        logging.warning('%s: too many requests, closing socket', user)
+                        abusive_sockets.inc()
+                        await ws.close(code=WSCloseCode.POLICY_VIOLATION)
+                        return True
+                elif not self.accepts(user, kind):
+                    dropped_requests.inc('notAccepted')
+                else:
+                    await self._handle_message(user, msg, self.clock.time())
             elif msg.type == WSMsgType.ERROR:
-                logging.exception('socket error', ws.exception())
-            elif msg.type == WSMsgType.CLOSE:
-                break
+                logging.error('socket error: %s', ws.exception())
+            elif msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED):
+                return msg.type == WSMsgType.CLOSE and msg.data == WSCloseCode.OK
             else:
                 logging.warning('unexpected message %s', msg.type)
 
-    async def _handle_message(self, user, msg):
+    async def _handle_message(self, user, msg, received_at):
         try:
-            message = Message(user=user, body=Box(msg.json()))
+            message = Message(user=user, body=self._decode(msg), received_at=received_at)
             await self.on_message(self, message)
         except:
             logging.exception('cannot handle message %s', msg)
 
+    def _decode(self, msg):
+        if msg.type == WSMsgType.binary:
+            return codec.decode_request(msg.data)
+        if msg.type == WSMsgType.text:
+            return messages.Request.parse(msg.json())
+        raise TypeError(f'Received message {msg.type} is not a request')
+
+    def _put(self, outbox, frame):
+        if outbox.binary and frame.binary is None:
+            self._encode_binary(frame)
+        outbox.put(frame)
+
+    def _encode_binary(self, frame):
+        if frame.frames:
+            frame.binary = codec.encode_batch([self._encode_binary(it) for it in frame.frames])
+        elif frame.binary is None:
+            frame.binary = self.codec.encode(frame.body, frame.seq)
+        return frame.binary
+
     async def send(self, user, body):
-        logging.debug('%s: sending %s', user, body)
-        ws = self.registry.sockets[user]
-        await ws.send_json(body)
+        logs.frames.debug('%s: sending %s', user, body)
+        self._flush()
+        self._put(self.registry.outboxes[user], messages.encode(body))
 
     async def publish(self, body):
-        logging.debug('publishing %s', body)
-        await asyncio.gather(*[ws.send_json(body) for ws in self.registry.sockets.values()])
+        logs.frames.debug('publishing %s', body)
+        self.seq += 1
+        frame = messages.encode(body, self.seq)
+        self.log.append(frame)
+        if self.coalesce_seconds is None:
+            self._fan_out(frame)
+            return
+        self.batch.append(frame)
+        if not self.flushing:
+            loop = asyncio.get_event_loop()
+            self.flushing = loop.call_later(self.coalesce_seconds, self._flush) if self.coalesce_seconds else \
+                loop.call_soon(self._flush)
+
+    def _flush(self):
+        if self.flushing:
+            self.flushing.cancel()
+            self.flushing = None
+        if self.batch:
+            frames, self.batch = self.batch, []
+            self._fan_out(frames[0] if len(frames) == 1 else messages.encode_batch(frames))
+
+    def _fan_out(self, frame):
+        with publish_seconds.time():
+            for outbox in self.registry.outboxes.values():
+                self._put(outbox, frame)
+
+    def rtt(self, user):
+        ws = self.registry.sockets.get(user)
+        return self.heartbeat.rtt(ws) if self.heartbeat and ws else 0
 
     async def receive(self, user, timeout=None):
-        logging.debug('%s: waiting for message', user)
+        logs.frames.debug('%s: waiting for message', user)
         ws = self.registry.sockets[user]
-        body = await ws.receive_json(timeout=timeout)
-        logging.debug('%s: received %s', user, body)
-        return Message(user=user, body=Box(body))
-
-    async def close(self):
-        for user, ws in self.registry.sockets.items():
-            await ws.close()
-            self.registry.unregister(user)
+        msg = await self.clock.wait_for(self._receive(ws), timeout)
+        body = self._decode(msg)
+        logs.frames.debug('%s: received %s', user, body)
+        return Message(user=user, body=body)
+
+    def snapshot(self):
+        return {'seq': self.seq, 'seats': {user: seat.token for user, seat in self.seats.items()}}
+
+    def restore(self, data):
+        self.seq = data['seq']
+        for user, token in data['seats'].items():
+            seat = self.seats[user] = Seat(token, restored=True)
+            self.registry.reserve(user)
+            seat.expiry = asyncio.ensure_future(self._expire(user, seat))
+            seat.detached.set()
+
+    async def close(self, code=WSCloseCode.OK):
+        self._flush()
+        self.closing = True
+        for seat in self.seats.values():
+            if seat.expiry:
+                seat.expiry.cancel()
+        for ws in list(self.registry.sockets.values()):
+            await ws.close(code=code)
+
+
+class Seat:
+    __slots__ = ('token', 'detached', 'expiry', 'restored')
+
+    def __init__(self, token=None, restored=False):
+        self.token = token or secrets.token_urlsafe(16)
+        self.detached = asyncio.Event()
+        self.expiry = None
+        self.restored = restored
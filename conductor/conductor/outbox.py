@@ -0,0 +1,79 @@
+import asyncio
+from collections import deque
+import logging
+
+from conductor import metrics
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+SUPERSEDING_EVENTS = ('question', 'snapshot')
+
+dropped_frames = metrics.counter('conductor_outbox_dropped_frames_total', 'Frames dropped by full outbound queues')
+disconnected_sockets = metrics.counter('conductor_outbox_disconnected_total', 'Sockets closed by full outbound queues')
+queue_depth = metrics.histogram('conductor_outbox_depth', 'Frames already queued when a new one is sent to a socket',
+                                buckets=metrics.SIZE_BUCKETS)
+
+
+class Outbox:
+    def __init__(self, ws, size, overflow_policy=DROP_OLDEST, binary=False):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy: {overflow_policy}')
+        self.ws = ws
+        self.size = size
+        self.overflow_policy = overflow_policy
+        self.binary = binary
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.writer = asyncio.ensure_future(self._write_frames())
+
+    def put(self, frame):
+        if self.closed:
+            return
+        queue_depth.observe(len(self.frames))
+        if len(self.frames) >= self.size and not self._make_room(frame):
+            return
+        self.frames.append(frame)
+        self.ready.set()
+
+    def _make_room(self, frame):
+        dropped_frames.inc()
+        if self.overflow_policy == DISCONNECT:
+            logging.warning('outbound queue full, disconnecting socket')
+            disconnected_sockets.inc()
+            self.close()
+            asyncio.ensure_future(self.ws.close())
+            return False
+        if self.overflow_policy == COALESCE:
+            key = getattr(frame, 'key', None)
+            for queued in self.frames:
+                if key in SUPERSEDING_EVENTS and getattr(queued, 'key', None) == key:
+                    self.frames.remove(queued)
+                    return True
+        self.frames.popleft()
+        return True
+
+    async def _write_frames(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.frames:
+                    frame = self.frames.popleft()
+                    if self.binary:
+                        await self.ws.send_bytes(frame.binary)
+                    else:
+                        await self.ws.send_str(frame)
+                self.ready.clear()
+        except ConnectionError:
+            logging.debug('socket gone, stopped writing frames')
+            self.closed = True
+
+    def depth(self):
+        return len(self.frames)
+
+    def close(self):
+        self.closed = True
+        self.frames.clear()
+        self.writer.cancel()
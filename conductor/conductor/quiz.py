@@ -1,57 +1,194 @@
-import aiohttp
+import asyncio
+from collections import deque
 import html
+import logging
 import random
-from box import Box
-from conductor.config import trivia_fetch_size, trivia_max_fetch_tentatives
 
+import aiohttp
+
+from conductor import metrics
+from conductor.clock import Clock
+from conductor.seen import skipped_questions
+
+SUCCESS = 0
 TOKEN_NOT_FOUND = 3
-TOKEN_EMPTY = 3
+TOKEN_EMPTY = 4
+RATE_LIMIT = 5
+
+fetch_seconds = metrics.histogram('conductor_quiz_fetch_seconds', 'Time spent fetching questions from OpenTrivia')
+buffered_questions = metrics.gauge('conductor_quiz_buffered', 'Questions fetched from OpenTrivia and not served yet')
+breaker_trips = metrics.counter('conductor_quiz_breaker_trips_total', 'Times OpenTrivia was skipped after many failures')
+
+
+class RetryableError(Exception):
+    pass
+
+
+def make_question(result):
+    from box import Box
+
+    answers = [result.correct_answer] + result.incorrect_answers
+    random.shuffle(answers)
+    return Box(
+        question=html.unescape(result.question),
+        answers=[html.unescape(it) for it in answers],
+        answer=answers.index(result.correct_answer)
+    )
 
 
 class OpenTriviaQuizSource:
-    def __init__(self, base_url='https://opentdb.com'):
+    def __init__(self,
+                 base_url='https://opentdb.com',
+                 fetch_size=10,
+                 max_fetch_tentatives=3,
+                 refill_watermark=5,
+                 retry_backoff_seconds=1,
+                 cache=None,
+                 max_connections=4,
+                 keepalive_seconds=30,
+                 dns_cache_seconds=300,
+                 connect_timeout_seconds=3,
+                 read_timeout_seconds=5,
+                 breaker_threshold=5,
+                 breaker_reset_seconds=30,
+                 clock=Clock(),
+                 seen=None,
+                 ):
         self.base_url = base_url
-        self.session = aiohttp.ClientSession()
+        self.fetch_size = fetch_size
+        self.max_fetch_tentatives = max_fetch_tentatives
+        self.refill_watermark = refill_watermark
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.cache = cache
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.dns_cache_seconds = dns_cache_seconds
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout_seconds, sock_read=read_timeout_seconds,
+                                             total=connect_timeout_seconds + read_timeout_seconds)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.clock = clock
+        self.seen = seen
+        self.failures = 0
+        self.opened_at = None
+        self.session = None
         self.token = None
-        self.tentative = 0
-        self.questions = []
+        self.questions = deque()
+        self.refill_task = None
+
+    async def warm_up(self):
+        try:
+            await self._refill()
+        except RuntimeError:
+            logging.warning('cannot warm up questions, fetching them on demand')
 
     async def next(self):
-        if len(self.questions) == 0:
-            self.questions = await self._fetch_questions()
-        return self.questions.pop()
+        if len(self.questions) <= self.refill_watermark:
+            self._refill()
+        try:
+            while not self.questions:
+                await asyncio.shield(self._refill())
+        except RuntimeError:
+            if not self.cache:
+                raise
+            logging.warning('OpenTrivia unavailable, drawing a question from the local bank')
+            return await self.cache.next()
+        question = self.questions.popleft()
+        buffered_questions.set(len(self.questions))
+        if self.seen:
+            self.seen.add(question.question)
+        return question
+
+    def _refill(self):
+        if not self.refill_task or self.refill_task.done():
+            self.refill_task = asyncio.ensure_future(self._fill())
+            self.refill_task.add_done_callback(self._log_refill_failure)
+        return self.refill_task
+
+    async def _fill(self):
+        results = await self._fetch_with_retry()
+        if self.cache:
+            await self.cache.add(results)
+        questions = [make_question(result) for result in results]
+        if self.seen:
+            fresh = [question for question in questions if question.question not in self.seen]
+            skipped_questions.inc(len(questions) - len(fresh))
+            questions = fresh or questions
+        self.questions.extend(questions)
+        buffered_questions.set(len(self.questions))
+
+    @staticmethod
+    def _log_refill_failure(task):
+        if not task.cancelled() and task.exception():
+            logging.error('cannot refill questions: %s', task.exception())
+
+    def _client(self):
+        if not self.session:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             keepalive_timeout=self.keepalive_seconds,
+                                             ttl_dns_cache=self.dns_cache_seconds)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    def _is_open(self):
+        if self.opened_at is None:
+            return False
+        if self.clock.time() - self.opened_at >= self.breaker_reset_seconds:
+            self.opened_at = None
+            self.failures = self.breaker_threshold - 1
+            return False
+        return True
+
+    def _failed(self):
+        self.failures += 1
+        if self.breaker_threshold and self.failures >= self.breaker_threshold and self.opened_at is None:
+            logging.error('too many OpenTrivia failures, pausing fetches for %ss', self.breaker_reset_seconds)
+            breaker_trips.inc()
+            self.opened_at = self.clock.time()
+
+    async def _fetch_with_retry(self):
+        for tentative in range(self.max_fetch_tentatives):
+            if self._is_open():
+                raise RuntimeError('OpenTrivia fetches paused after too many failures')
+            try:
+                with fetch_seconds.time():
+                    results = await self._fetch_questions()
+                self.failures = 0
+                return results
+            except (RetryableError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning('OpenTrivia fetch failed (%s/%s): %r', tentative + 1, self.max_fetch_tentatives, e)
+                self._failed()
+                if self.opened_at is not None or tentative + 1 == self.max_fetch_tentatives:
+                    break
+            await self.clock.sleep(self.retry_backoff_seconds * 2 ** tentative)
+        raise RuntimeError('Too many OpenTrivia failures')
 
     async def _fetch_questions(self):
-        if self.tentative > trivia_max_fetch_tentatives:
-            raise RuntimeError('Too many OpenTrivia failures')
         if not self.token:
             self.token = await self._acquire_token()
-        async with self.session.get(f'{self.base_url}/api.php',
-                                    params=Box(amount=trivia_fetch_size, type='multiple', token=self.token)) as res:
+        params = {'amount': self.fetch_size, 'type': 'multiple', 'token': self.token}
+        async with self._client().get(f'{self.base_url}/api.php', params=params) as res:
+            from box import Box
+
             body = Box(await res.json())
-            if body.response_code == 0:
-                self.tentative = 0
-                return [self._make_question(result) for result in body.results]
+            if body.response_code == SUCCESS:
+                return body.results
             if body.response_code == TOKEN_NOT_FOUND or body.response_code == TOKEN_EMPTY:
                 self.token = None
-                self.tentative += 1
-                return self.next()
+                raise RetryableError(f'OpenTrivia token expired: {body.response_code}')
+            if body.response_code == RATE_LIMIT:
+                raise RetryableError('OpenTrivia rate limit')
             raise RuntimeError(f'Unexpected OpenTrivia error: {body}')
 
     async def _acquire_token(self):
-        async with self.session.get(f'{self.base_url}/api_token.php', params=Box(command='request')) as res:
+        async with self._client().get(f'{self.base_url}/api_token.php', params={'command': 'request'}) as res:
             body = await res.json()
             return body['token']
 
     async def close(self):
-        await self.session.close()
-
-    @staticmethod
-    def _make_question(result):
-        answers = [result.correct_answer] + result.incorrect_answers
-        random.shuffle(answers)
-        return Box(
-            question=html.unescape(result.question),
-            answers=[html.unescape(it) for it in answers],
-            answer=answers.index(result.correct_answer)
-        )
+        if self.refill_task:
+            self.refill_task.cancel()
+        if self.session:
+            await self.session.close()
+        if self.cache:
+            await self.cache.close()
@@ -0,0 +1,67 @@
+from collections import OrderedDict, deque
+
+from conductor.clock import Clock
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def take(self, now, amount=1):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class RequestLimiter:
+    __slots__ = ('buckets', 'violated_at', 'window_seconds', 'clock')
+
+    def __init__(self, limits, clock=Clock(), window_seconds=60):
+        now = clock.time()
+        self.buckets = {kind: TokenBucket(rate, burst, now) for kind, (rate, burst) in limits.items()}
+        self.violated_at = deque()
+        self.window_seconds = window_seconds
+        self.clock = clock
+
+    @property
+    def violations(self):
+        expired = self.clock.time() - self.window_seconds
+        while self.violated_at and self.violated_at[0] <= expired:
+            self.violated_at.popleft()
+        return len(self.violated_at)
+
+    def allow(self, kind):
+        now = self.clock.time()
+        bucket = self.buckets.get(kind)
+        if bucket is None or bucket.take(now):
+            return True
+        self.violated_at.append(now)
+        return False
+
+
+class RateLimiter:
+    def __init__(self, rate, burst, max_keys=10000, clock=Clock()):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self.buckets = OrderedDict()
+
+    def allow(self, key):
+        now = self.clock.time()
+        bucket = self.buckets.get(key)
+        if bucket:
+            self.buckets.move_to_end(key)
+        else:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return bucket.take(now)
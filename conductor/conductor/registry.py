@@ -1,19 +1,56 @@
 import logging
 
+from conductor import metrics
+from conductor.outbox import DROP_OLDEST, Outbox
+
+active_sockets = metrics.gauge('conductor_active_sockets', 'Registered sockets')
+rejections = metrics.counter('conductor_rejections_total', 'Rejected connections by reason', label='reason')
+
 
 class SocketRegistry:
-    def __init__(self, max_sockets):
+    def __init__(self, max_sockets, queue_size=64, overflow_policy=DROP_OLDEST):
         self.max_sockets = max_sockets
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
         self.sockets = {}
+        self.outboxes = {}
+        self.reserved = set()
+
+    def free_slots(self):
+        return self.max_sockets - len(self.sockets) - len(self.reserved)
+
+    def has_space(self):
+        return self.free_slots() > 0
 
-    def register(self, ws, uid):
-        if len(self.sockets) >= self.max_sockets:
+    def is_empty(self):
+        return len(self.sockets) == 0 and len(self.reserved) == 0
+
+    def register(self, ws, uid, binary=False, resume=False):
+        if resume and uid in self.reserved:
+            self.reserved.remove(uid)
+        elif not self.has_space():
+            rejections.inc('maxSocketsReached')
             return 'maxSocketsReached'
-        if uid in self.sockets:
+        elif uid in self.sockets or uid in self.reserved:
+            rejections.inc('usernameNotAvailable')
             return 'usernameNotAvailable'
         self.sockets[uid] = ws
+        self.outboxes[uid] = Outbox(ws, self.queue_size, self.overflow_policy, binary)
+        active_sockets.inc()
         logging.debug('%s: registered socket', uid)
 
     def unregister(self, uid):
         del self.sockets[uid]
+        self.outboxes.pop(uid).close()
+        active_sockets.dec()
         logging.debug('%s: unregistered socket', uid)
+
+    def suspend(self, uid):
+        self.unregister(uid)
+        self.reserve(uid)
+
+    def reserve(self, uid):
+        self.reserved.add(uid)
+
+    def release(self, uid):
+        self.reserved.discard(uid)
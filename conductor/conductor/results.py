@@ -0,0 +1,143 @@
+import asyncio
+from collections import namedtuple
+import hashlib
+import logging
+import sqlite3
+import time
+
+from aiohttp import web
+
+from conductor import metrics
+from conductor.messages import dumps
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    room TEXT,
+    question TEXT NOT NULL,
+    winner TEXT,
+    challenge_seconds REAL,
+    ended_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS losses (
+    round INTEGER NOT NULL REFERENCES rounds (id),
+    user TEXT NOT NULL,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    user TEXT PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS scores_rank ON scores (wins DESC, losses);
+'''
+
+buffered_results = metrics.gauge('conductor_results_buffered', 'Round results waiting to be written')
+dropped_results = metrics.counter('conductor_results_dropped_total', 'Round results dropped by a full buffer')
+flush_seconds = metrics.histogram('conductor_results_flush_seconds', 'Time spent writing a batch of round results')
+
+Result = namedtuple('Result', ['room', 'question', 'winner', 'losses', 'challenge_seconds', 'ended_at'])
+
+
+def question_id(text):
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def round_result(room, question, winner, losses, challenge_seconds=None):
+    return Result(room, question_id(question), winner, dict(losses), challenge_seconds, time.time())
+
+
+class ResultStore:
+    def __init__(self, path, batch_size=100, flush_interval_seconds=1, max_buffered=10000, leaderboard_size=10):
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_buffered = max_buffered
+        self.leaderboard_size = leaderboard_size
+        self.buffer = []
+        self.full = asyncio.Event()
+        self.closing = False
+        self.top = None
+        self.body = None
+        self._set_leaderboard(self._read_leaderboard())
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    def record(self, result):
+        if len(self.buffer) >= self.max_buffered:
+            dropped_results.inc()
+            return
+        self.buffer.append(result)
+        buffered_results.set(len(self.buffer))
+        if len(self.buffer) >= self.batch_size:
+            self.full.set()
+
+    def leaderboard(self):
+        return self.top
+
+    def _set_leaderboard(self, top):
+        self.top = top
+        self.body = dumps(top)
+
+    async def _run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                logging.exception('cannot write round results')
+
+    async def flush(self):
+        self.full.clear()
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        buffered_results.set(0)
+        loop = asyncio.get_event_loop()
+        with flush_seconds.time():
+            self._set_leaderboard(await loop.run_in_executor(None, self._write, batch))
+
+    def _write(self, batch):
+        with self.db:
+            for item in batch:
+                cursor = self.db.execute(
+                    'INSERT INTO rounds (room, question, winner, challenge_seconds, ended_at) VALUES (?, ?, ?, ?, ?)',
+                    (item.room, item.question, item.winner, item.challenge_seconds, item.ended_at))
+                self.db.executemany('INSERT INTO losses (round, user, reason) VALUES (?, ?, ?)',
+                                    [(cursor.lastrowid, user, reason) for user, reason in item.losses.items()])
+            self.db.executemany(
+                'INSERT INTO scores (user, wins) VALUES (?, 1) ON CONFLICT (user) DO UPDATE SET wins = wins + 1',
+                [(item.winner,) for item in batch if item.winner])
+            self.db.executemany(
+                'INSERT INTO scores (user, losses) VALUES (?, 1) ON CONFLICT (user) DO UPDATE SET losses = losses + 1',
+                [(user,) for item in batch for user in item.losses])
+        return self._read_leaderboard()
+
+    def _read_leaderboard(self):
+        rows = self.db.execute('SELECT user, wins, losses FROM scores ORDER BY wins DESC, losses LIMIT ?',
+                               (self.leaderboard_size,))
+        return [{'user': user, 'wins': wins, 'losses': losses} for user, wins, losses in rows]
+
+    async def close(self):
+        self.closing = True
+        self.full.set()
+        if self.task:
+            await self.task
+        await self.flush()
+        self.db.close()
+
+
+def leaderboard_handler(results):
+    async def handler(_request):
+        return web.Response(text=results.body, content_type='application/json',
+                            headers={'Cache-Control': 'public, max-age=1'})
+
+    return handler
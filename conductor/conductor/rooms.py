@@ -0,0 +1,217 @@
+import itertools
+import logging
+
+from aiohttp import WSCloseCode, web
+
+from conductor import codec, metrics
+from conductor.network import prepare_websocket
+from conductor.registry import rejections
+from conductor.validation import compile_schema
+
+open_rooms = metrics.gauge('conductor_rooms', 'Open rooms')
+
+
+class Room:
+    def __init__(self, room_id, network, conductor):
+        self.id = room_id
+        self.network = network
+        self.conductor = conductor
+        self.pending = 0
+
+    def has_space(self):
+        return self.network.registry.free_slots() > self.pending
+
+    def is_empty(self):
+        return self.network.registry.is_empty() and not self.pending
+
+    def users(self):
+        return list(self.network.registry.sockets)
+
+    def close(self):
+        if self.conductor:
+            self.conductor.close()
+
+
+class RoomManager:
+    request_schema = {
+        'uid': {
+            'type': 'string',
+            'empty': False
+        },
+        'room': {
+            'type': 'string',
+            'empty': False,
+            'maxlength': 64
+        },
+        'encoding': {
+            'type': 'string',
+            'allowed': codec.ENCODINGS
+        },
+        'token': {
+            'type': 'string',
+            'empty': False
+        },
+        'seq': {
+            'type': 'string',
+            'regex': '[0-9]+'
+        }
+    }
+    validate_query = staticmethod(compile_schema(request_schema, allow_unknown=True))
+
+    def __init__(self, room_factory, max_rooms, router=None, lobby=None):
+        self.room_factory = room_factory
+        self.max_rooms = max_rooms
+        self.router = router
+        self.lobby = lobby
+        self.rooms = {}
+        self.public = set()
+        self.vacant = {}
+        self.ids = itertools.count(1)
+        self.draining = False
+
+    async def __call__(self, request):
+        query = self._read_query(request)
+        ws = await prepare_websocket(request)
+        if self.draining:
+            await ws.close(code=WSCloseCode.SERVICE_RESTART)
+            return ws
+        if query.get('room') and not self._owns(query['room']):
+            await ws.send_json({'event': 'redirect', 'room': query['room'], 'port': self.router.port(query['room'])})
+            await ws.close()
+            return ws
+        resuming = self._resuming(query)
+        queueing = self.lobby and not resuming
+        room = None if queueing and not self.lobby.is_empty() else self._place(query.get('room'))
+        if queueing and not (room and room.has_space()):
+            if self.lobby.is_full():
+                rejections.inc('lobbyFull')
+                await ws.send_json({'event': 'rejected', 'reason': 'lobbyFull'})
+                return ws
+            room = await self.lobby.wait(ws, query.get('room'), self._vacancy)
+            if not room:
+                return ws
+            room.pending -= 1
+        elif not room:
+            rejections.inc('maxRoomsReached')
+            await ws.send_json({'event': 'rejected', 'reason': 'maxRoomsReached'})
+            return ws
+        elif not resuming and not room.has_space():
+            rejections.inc('maxSocketsReached')
+            await ws.send_json({'event': 'rejected', 'reason': 'maxSocketsReached'})
+            self._release(room)
+            return ws
+        try:
+            return await room.network.serve(ws, query['uid'], query.get('encoding', codec.JSON), query.get('token'),
+                                            query.get('seq'))
+        finally:
+            self._release(room)
+
+    def _read_query(self, request):
+        query = dict(request.query)
+        if not self.validate_query(query):
+            raise web.HTTPBadRequest()
+        return query
+
+    def _resuming(self, query):
+        room = self.rooms.get(query.get('room'))
+        seat = room and room.network.seats.get(query['uid'])
+        return bool(seat) and query.get('token') == seat.token
+
+    def _place(self, room_id):
+        if room_id:
+            return self.rooms.get(room_id) or self._open(room_id)
+        for vacant_id in list(self.vacant):
+            room = self.rooms.get(vacant_id)
+            if room and room.has_space():
+                return room
+            del self.vacant[vacant_id]
+        return self._open(self._next_id(), public=True)
+
+    def _vacancy(self, room_id):
+        room = (self.rooms.get(room_id) or self._open(room_id)) if room_id else self._place(None)
+        return room if room and room.has_space() else None
+
+    def _owns(self, room_id):
+        return not self.router or self.router.owns(room_id)
+
+    def _next_id(self):
+        while True:
+            room_id = str(next(self.ids))
+            if room_id not in self.rooms and self._owns(room_id):
+                return room_id
+
+    def _open(self, room_id, public=False):
+        if len(self.rooms) >= self.max_rooms:
+            return None
+
+        async def release(_network, _user):
+            self._release(room)
+
+        room = self.room_factory(room_id)
+        room.network.on_expired = release
+        self.rooms[room_id] = room
+        open_rooms.inc()
+        if public:
+            self.public.add(room_id)
+            self.vacant[room_id] = True
+        logging.debug('%s: opened room', room_id)
+        return room
+
+    def _release(self, room):
+        if self.rooms.get(room.id) is not room:
+            return
+        if room.is_empty():
+            del self.rooms[room.id]
+            self.public.discard(room.id)
+            self.vacant.pop(room.id, None)
+            room.close()
+            open_rooms.dec()
+            logging.debug('%s: closed room', room.id)
+        elif room.has_space() and room.id in self.public:
+            self.vacant[room.id] = True
+        if self.lobby:
+            self.lobby.admit(self._vacancy)
+
+    def table(self):
+        return {room_id: room.users() for room_id, room in self.rooms.items()}
+
+    def drain(self):
+        self.draining = True
+        if self.lobby:
+            self.lobby.close()
+
+    def snapshot(self):
+        return {'rooms': [
+            {
+                'id': room.id,
+                'public': room.id in self.public,
+                'network': room.network.snapshot(),
+                'session': room.conductor.snapshot() if room.conductor else None
+            } for room in self.rooms.values() if room.network.seats
+        ]}
+
+    def restore(self, state):
+        restored = 0
+        for data in state['rooms']:
+            if data['id'] in self.rooms or not self._owns(data['id']):
+                continue
+            room = self._open(data['id'], public=data['public'])
+            if not room:
+                break
+            if room.conductor:
+                room.conductor.restore(data['session'])
+            room.network.restore(data['network'])
+            restored += 1
+        return restored
+
+    async def close(self):
+        if self.lobby:
+            self.lobby.close()
+        code = WSCloseCode.SERVICE_RESTART if self.draining else WSCloseCode.OK
+        for room in list(self.rooms.values()):
+            await room.network.close(code)
+            room.close()
+            open_rooms.dec()
+        self.rooms.clear()
+        self.public.clear()
+        self.vacant.clear()
@@ -0,0 +1,87 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+
+from conductor import metrics
+
+HEADER = struct.Struct('<4sIIII')
+MAGIC = b'SEEN'
+
+skipped_questions = metrics.counter('conductor_quiz_skipped_total', 'Fetched or drawn questions skipped as already served')
+
+
+def _positions(text, bits, hashes):
+    digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class BloomFilter:
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data else bytearray((bits + 7) // 8)
+
+    def add(self, text):
+        for position in _positions(text, self.bits, self.hashes):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, text):
+        return all(self.data[position >> 3] & 1 << (position & 7)
+                   for position in _positions(text, self.bits, self.hashes))
+
+
+# Two Bloom filters of `capacity` questions each: when the current one is full the older is dropped,
+# so memory stays fixed and a question can come back after between 1 and 2 times `capacity` others.
+class SeenSet:
+    def __init__(self, capacity=10000, error_rate=0.01, path=None):
+        self.capacity = capacity
+        self.bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.path = path
+        self.current = BloomFilter(self.bits, self.hashes)
+        self.previous = BloomFilter(self.bits, self.hashes)
+        self.count = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def __contains__(self, text):
+        return text in self.current or text in self.previous
+
+    def add(self, text):
+        if text in self:
+            return False
+        if self.count >= self.capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.bits, self.hashes)
+            self.count = 0
+        self.current.add(text)
+        self.count += 1
+        return True
+
+    def _load(self):
+        with open(self.path, 'rb') as fp:
+            magic, bits, hashes, capacity, count = HEADER.unpack(fp.read(HEADER.size))
+            if (magic, bits, hashes, capacity) != (MAGIC, self.bits, self.hashes, self.capacity):
+                logging.warning('%s: seen questions saved with other settings, starting afresh', self.path)
+                return
+            size = len(self.current.data)
+            self.current = BloomFilter(bits, hashes, fp.read(size))
+            self.previous = BloomFilter(bits, hashes, fp.read(size))
+            self.count = count
+
+    def save(self):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, self.bits, self.hashes, self.capacity, self.count))
+            fp.write(self.current.data)
+            fp.write(self.previous.data)
+        os.replace(temporary, self.path)
+
+    def close(self):
+        self.save()
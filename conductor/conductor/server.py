@@ -1,51 +1,197 @@
+import asyncio
 import logging
-import os.path
 from aiohttp import web
 
-from conductor.game import Conductor
-from conductor.config import log_level, port, static_files_path, max_sockets, challenge_timeout_seconds, \
-    seconds_before_new_session
+from conductor import handoff, logs, metrics
+from conductor.game import Conductor, round_seconds
+from conductor.config import log_level, port, static_files_path, max_sockets, max_rooms, challenge_timeout_seconds, \
+    seconds_before_new_session, outbound_queue_size, outbound_overflow_policy, trivia_fetch_size, \
+    trivia_max_fetch_tentatives, trivia_refill_watermark, trivia_retry_backoff_seconds, quiz_bank_path, quiz_source_type, \
+    workers, worker_port_base, cluster_socket, heartbeat_interval_seconds, heartbeat_timeout_seconds, \
+    idle_timeout_seconds, resume_grace_seconds, event_log_size, lobby_size, connection_rate, connection_burst, \
+    request_limits, max_request_violations, challenge_window_seconds, challenge_rtt_compensation, \
+    trivia_max_connections, trivia_keepalive_seconds, trivia_dns_cache_seconds, trivia_connect_timeout_seconds, \
+    trivia_read_timeout_seconds, trivia_breaker_threshold, trivia_breaker_reset_seconds, seen_questions_capacity, \
+    seen_questions_path, log_format, log_sampling, session_snapshot_path, session_snapshot_max_age_seconds, \
+    results_path, results_batch_size, results_flush_seconds, leaderboard_size, coalesce_events, coalesce_seconds, \
+    use_uvloop, request_violation_window_seconds, client_address_header
+from conductor.cluster import DirectoryClient, LocalDirectory, Router, rooms_handler, serve_worker, supervise
+from conductor.assets import Assets
+from conductor.bank import LocalQuizSource, QuestionBank
+from conductor.health import Health
+from conductor.heartbeat import Heartbeat
+from conductor.lobby import Lobby
 from conductor.network import Network
 from conductor.quiz import OpenTriviaQuizSource
-from conductor.registry import SocketRegistry
+from conductor.ratelimit import RateLimiter
+from conductor.registry import SocketRegistry, rejections
+from conductor.results import ResultStore, leaderboard_handler
+from conductor.rooms import Room, RoomManager
+from conductor.seen import SeenSet
 
 
-async def index(_request):
-    return web.FileResponse(os.path.join(static_files_path, 'index.html'))
+def client_address(request, header=None):
+    forwarded = request.headers.get(header) if header else None
+    return forwarded.rsplit(',', 1)[-1].strip() if forwarded else request.remote
 
 
-def application(network, shutdown):
-    app = web.Application()
+def rate_limit(limiter, address_header=None):
+    @web.middleware
+    async def middleware(request, handler):
+        if request.path == '/play' and not limiter.allow(client_address(request, address_header)):
+            rejections.inc('rateLimited')
+            raise web.HTTPTooManyRequests()
+        return await handler(request)
+
+    return middleware
+
+
+def application(network, shutdown, directory=None, limiter=None, assets=None, results=None, health=None,
+                address_header=None):
+    middlewares = [health.middleware] if health else []
+    if limiter:
+        middlewares.append(rate_limit(limiter, address_header))
+    app = web.Application(middlewares=middlewares)
     app.on_shutdown.append(shutdown)
     app.add_routes([
-        web.get('/', index),
-        web.get('/play', network)
+        web.get('/play', network),
+        web.get('/metrics', metrics.handler)
     ])
-    if static_files_path:
-        app.add_routes([web.static('/', static_files_path)])
+    if health:
+        app.add_routes([web.get('/healthz', health.liveness), web.get('/readyz', health.readiness)])
+    if directory:
+        app.add_routes([web.get('/rooms', rooms_handler(directory))])
+    if results:
+        app.add_routes([web.get('/leaderboard', leaderboard_handler(results))])
+    if assets:
+        app.add_routes([web.get('/{path:.*}', assets.handler)])
     return app
 
 
-def serve():
-    async def shutdown(_app):
-        await network.close()
+def create_quiz_source(seen):
+    local_source = LocalQuizSource(QuestionBank(quiz_bank_path), seen=seen) if quiz_bank_path else None
+    if quiz_source_type == 'local':
+        if not local_source:
+            raise ValueError('QUIZ_BANK_PATH is required by the local quiz source')
+        return local_source
+    return OpenTriviaQuizSource(
+        fetch_size=trivia_fetch_size,
+        max_fetch_tentatives=trivia_max_fetch_tentatives,
+        refill_watermark=trivia_refill_watermark,
+        retry_backoff_seconds=trivia_retry_backoff_seconds,
+        cache=local_source,
+        max_connections=trivia_max_connections,
+        keepalive_seconds=trivia_keepalive_seconds,
+        dns_cache_seconds=trivia_dns_cache_seconds,
+        connect_timeout_seconds=trivia_connect_timeout_seconds,
+        read_timeout_seconds=trivia_read_timeout_seconds,
+        breaker_threshold=trivia_breaker_threshold,
+        breaker_reset_seconds=trivia_breaker_reset_seconds,
+        seen=seen,
+    )
+
+
+def worker_path(path, worker):
+    return f'{path}.{worker}' if path and worker is not None else path
+
+
+async def create_application(worker=None):
+    async def startup(app):
+        heartbeat.start()
+        if results:
+            results.start()
+        await directory.start()
+        app['warm_up'] = asyncio.ensure_future(health.warm_up(quiz_source.warm_up()))
+
+    async def shutdown(app):
+        app['warm_up'].cancel()
+        health.set_ready(False)
+        await heartbeat.close()
+        if snapshot_path:
+            rooms.drain()
+            handoff.save(snapshot_path, rooms)
+        await rooms.close()
+        if results:
+            await results.close()
         await quiz_source.close()
+        if seen:
+            seen.close()
+        await directory.close()
 
-    logging.basicConfig(level=log_level)
+    def new_room(room_id):
+        conductor = Conductor(
+            quiz_source=quiz_source,
+            challenge_timeout_seconds=challenge_timeout_seconds,
+            seconds_before_new_session=seconds_before_new_session,
+            challenge_window_seconds=challenge_window_seconds,
+            rtt_compensation=challenge_rtt_compensation,
+            results=results,
+            room=room_id,
+        )
+        network = Network(
+            registry=SocketRegistry(max_sockets, outbound_queue_size, outbound_overflow_policy),
+            on_enter=conductor.on_enter,
+            on_message=conductor.on_message,
+            on_exit=conductor.on_exit,
+            on_resume=conductor.on_resume,
+            accepts=conductor.accepts,
+            room=room_id,
+            heartbeat=heartbeat,
+            resume_grace_seconds=resume_grace_seconds,
+            event_log_size=event_log_size,
+            request_limits=request_limits,
+            max_violations=max_request_violations,
+            violation_window_seconds=request_violation_window_seconds,
+            coalesce_seconds=coalesce_seconds if coalesce_events else None
+        )
+        return Room(room_id, network, conductor)
+
+    seen_path = worker_path(seen_questions_path, worker)
+    snapshot_path = worker_path(session_snapshot_path, worker)
+    seen = SeenSet(seen_questions_capacity, path=seen_path) if seen_questions_capacity else None
+    quiz_source = create_quiz_source(seen)
+    results = ResultStore(results_path, results_batch_size, results_flush_seconds,
+                          leaderboard_size=leaderboard_size) if results_path else None
+    heartbeat = Heartbeat(heartbeat_interval_seconds, heartbeat_timeout_seconds, idle_timeout_seconds)
+    router = Router(worker, workers, worker_port_base) if worker is not None else None
+    lobby = Lobby(lobby_size, round_seconds) if lobby_size else None
+    rooms = RoomManager(new_room, max_rooms, router, lobby)
+    if snapshot_path:
+        handoff.restore(snapshot_path, rooms, session_snapshot_max_age_seconds)
+    directory = DirectoryClient(cluster_socket, worker, rooms) if router else LocalDirectory(rooms)
+    limiter = RateLimiter(connection_rate, connection_burst) if connection_rate else None
+    assets = Assets(static_files_path) if static_files_path else None
+    health = Health()
+    app = application(rooms, shutdown, directory, limiter, assets, results, health, client_address_header)
+    app.on_startup.append(startup)
+    return app
+
+
+def install_uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        logging.warning('uvloop is not installed, using the default event loop')
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def serve():
+    def run_worker(worker):
+        listener = logs.setup(log_level, log_format, log_sampling)
+        try:
+            asyncio.run(serve_worker(create_application(worker), [port, worker_port_base + worker]))
+        finally:
+            logs.stop(listener)
+
+    logs.setup(log_level, log_format, log_sampling)
+    if use_uvloop:
+        install_uvloop()
     logging.info('starting conductor on port %s', port)
-    quiz_source = OpenTriviaQuizSource()
-    conductor = Conductor(
-        quiz_source=quiz_source,
-        challenge_timeout_seconds=challenge_timeout_seconds,
-        seconds_before_new_session=seconds_before_new_session,
-    )
-    network = Network(
-        registry=SocketRegistry(max_sockets),
-        on_enter=conductor.on_enter,
-        on_message=conductor.on_message,
-        on_exit=conductor.on_exit
-    )
-    web.run_app(application(network, shutdown), port=port)
+    if workers > 1:
+        supervise(workers, run_worker, cluster_socket)
+    else:
+        web.run_app(create_application(), port=port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import cProfile
+import hashlib
+import json
+import pstats
+import random
+import sys
+import time
+from itertools import cycle
+
+from box import Box
+
+from conductor import messages
+from conductor.clock import VirtualClock
+from conductor.game import Conductor
+from conductor.messages import Request
+from conductor.network import Message
+
+
+class SimulatedQuizSource:
+    def __init__(self, size=100):
+        self.quiz = cycle([
+            Box(question=f'Question {i}?', answers=['a', 'b', 'c', 'd'], answer=i % 4) for i in range(size)
+        ])
+
+    async def next(self):
+        return next(self.quiz)
+
+
+class SimulatedNetwork:
+    def __init__(self, clock, bots, rounds):
+        self.clock = clock
+        self.bots = bots
+        self.rounds = rounds
+        self.ended = 0
+        self.events = 0
+        self.digest = hashlib.sha256()
+        self.done = asyncio.Event()
+
+    def _record(self, user, body):
+        self.events += 1
+        self.digest.update(f'{self.clock.time():.6f} {user} '.encode())
+        self.digest.update(messages.encode(body).encode())
+
+    async def send(self, user, body):
+        self._record(user, body)
+
+    async def publish(self, body):
+        self._record('*', body)
+        if body.event == 'end':
+            self.ended += 1
+            if self.ended >= self.rounds:
+                self.done.set()
+
+    async def receive(self, user, timeout=None):
+        return await self.clock.wait_for(self.bots[user].answer(), timeout)
+
+
+class Bot:
+    def __init__(self, uid, conductor, clock, rng, challenge_rate, answer_latency, accuracy):
+        self.uid = uid
+        self.conductor = conductor
+        self.clock = clock
+        self.rng = rng
+        self.challenge_rate = challenge_rate
+        self.answer_latency = answer_latency
+        self.accuracy = accuracy
+
+    async def play(self, network):
+        await self.conductor.on_enter(network, self.uid)
+        while True:
+            await self.clock.sleep(self.rng.expovariate(self.challenge_rate))
+            if self.conductor.accepts(self.uid, 'challenge'):
+                await self.conductor.on_message(network, Message(user=self.uid, body=Request(action='challenge')))
+
+    async def answer(self):
+        await self.clock.sleep(self.rng.expovariate(1 / self.answer_latency))
+        quiz = self.conductor.session.quiz
+        answer = quiz.answer if self.rng.random() < self.accuracy else (quiz.answer + 1) % len(quiz.answers)
+        return Message(user=self.uid, body=Request(answer=answer))
+
+
+async def simulate(rounds, players, seed=0, challenge_rate=0.5, answer_latency=1, accuracy=0.5,
+                   challenge_timeout_seconds=5, seconds_before_new_session=3, clock=None):
+    clock = clock or VirtualClock()
+    rng = random.Random(seed)
+    conductor = Conductor(
+        quiz_source=SimulatedQuizSource(),
+        challenge_timeout_seconds=challenge_timeout_seconds,
+        seconds_before_new_session=seconds_before_new_session,
+        clock=clock,
+    )
+    bots = {}
+    network = SimulatedNetwork(clock, bots, rounds)
+    for i in range(players):
+        uid = f'bot{i}'
+        bots[uid] = Bot(uid, conductor, clock, rng, challenge_rate, answer_latency, accuracy)
+    tasks = [asyncio.ensure_future(bot.play(network)) for bot in bots.values()]
+    await network.done.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return Box(rounds=network.ended, events=network.events, virtual_seconds=clock.time(),
+               digest=network.digest.hexdigest())
+
+
+def run(rounds, players, **kwargs):
+    clock = VirtualClock()
+    start = time.perf_counter()
+    report = clock.run(simulate(rounds, players, clock=clock, **kwargs))
+    report.wall_seconds = time.perf_counter() - start
+    report.rounds_per_second = report.rounds / report.wall_seconds
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play whole games on virtual time')
+    parser.add_argument('--rounds', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--challenge-rate', type=float, default=0.5, help='challenges per player per second')
+    parser.add_argument('--answer-latency', type=float, default=1, help='mean seconds taken to answer')
+    parser.add_argument('--accuracy', type=float, default=0.5, help='probability of a correct answer')
+    parser.add_argument('--challenge-timeout', type=int, default=5)
+    parser.add_argument('--seconds-before-new-session', type=int, default=3)
+    parser.add_argument('--profile', action='store_true', help='print the hottest functions')
+    args = parser.parse_args()
+
+    profile = cProfile.Profile() if args.profile else None
+    if profile:
+        profile.enable()
+    report = run(args.rounds, args.players, seed=args.seed, challenge_rate=args.challenge_rate,
+                 answer_latency=args.answer_latency, accuracy=args.accuracy,
+                 challenge_timeout_seconds=args.challenge_timeout,
+                 seconds_before_new_session=args.seconds_before_new_session)
+    if profile:
+        profile.disable()
+        pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+    sys.stdout.write(json.dumps(report, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
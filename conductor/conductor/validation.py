@@ -0,0 +1,35 @@
+import re
+
+TYPES = {'string': str, 'integer': int}
+
+
+def compile_schema(schema, allow_unknown=False):
+    checks = {field: _compile_rules(rules) for field, rules in schema.items()}
+
+    def validate(document):
+        if not allow_unknown and not document.keys() <= checks.keys():
+            return False
+        return all(check(document[field]) for field, check in checks.items() if field in document)
+
+    return validate
+
+
+def _compile_rules(rules):
+    expected = TYPES[rules['type']]
+    empty = rules.get('empty', True)
+    maxlength = rules.get('maxlength')
+    allowed = rules.get('allowed')
+    regex = re.compile(rules['regex']) if 'regex' in rules else None
+
+    def check(value):
+        if type(value) is not expected:
+            return False
+        if not empty and len(value) == 0:
+            return False
+        if maxlength is not None and len(value) > maxlength:
+            return False
+        if regex and not regex.fullmatch(value):
+            return False
+        return allowed is None or value in allowed
+
+    return check
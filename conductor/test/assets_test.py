@@ -0,0 +1,70 @@
+import gzip
+from unittest.mock import AsyncMock
+
+from conductor.assets import Assets, IMMUTABLE, REVALIDATE, precompress
+from conductor.server import application
+
+SCRIPT = b'console.log("hello");\n' * 100
+
+
+def build(root):
+    (root / 'static' / 'js').mkdir(parents=True)
+    (root / 'index.html').write_bytes(b'<html>' + b' ' * 2000 + b'</html>')
+    (root / 'static' / 'js' / 'main.1a2b3c4d.chunk.js').write_bytes(SCRIPT)
+    (root / 'logo.png').write_bytes(b'\x89PNG' + bytes(100))
+    return str(root)
+
+
+async def client_for(aiohttp_client, assets):
+    return await aiohttp_client(application(AsyncMock(), shutdown=AsyncMock(), assets=assets))
+
+
+async def test_serve_index_revalidated_by_etag(aiohttp_client, tmp_path):
+    client = await client_for(aiohttp_client, Assets(build(tmp_path)))
+    res = await client.get('/')
+    assert res.status == 200
+    assert res.headers['Cache-Control'] == REVALIDATE
+    assert (await res.read()).startswith(b'<html>')
+    res = await client.get('/', headers={'If-None-Match': res.headers['ETag']})
+    assert res.status == 304
+
+
+async def test_serve_hashed_bundles_compressed_and_immutable(aiohttp_client, tmp_path):
+    client = await client_for(aiohttp_client, Assets(build(tmp_path)))
+    res = await client.get('/static/js/main.1a2b3c4d.chunk.js', headers={'Accept-Encoding': 'gzip'},
+                           auto_decompress=False)
+    assert res.headers['Cache-Control'] == IMMUTABLE
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert res.content_type.endswith('javascript')
+    assert gzip.decompress(await res.read()) == SCRIPT
+    res = await client.get('/static/js/main.1a2b3c4d.chunk.js', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in res.headers
+    assert await res.read() == SCRIPT
+
+
+async def test_do_not_compress_binary_files(aiohttp_client, tmp_path):
+    client = await client_for(aiohttp_client, Assets(build(tmp_path)))
+    res = await client.get('/logo.png', headers={'Accept-Encoding': 'gzip'}, auto_decompress=False)
+    assert 'Content-Encoding' not in res.headers
+    assert res.content_type == 'image/png'
+
+
+async def test_serve_large_files_from_disk(aiohttp_client, tmp_path):
+    client = await client_for(aiohttp_client, Assets(build(tmp_path), max_memory_size=100))
+    res = await client.get('/static/js/main.1a2b3c4d.chunk.js')
+    assert res.status == 200
+    assert res.headers['Cache-Control'] == IMMUTABLE
+    assert await res.read() == SCRIPT
+    res = await client.get('/missing.js')
+    assert res.status == 404
+
+
+async def test_use_precompressed_files(aiohttp_client, tmp_path):
+    root = build(tmp_path)
+    assert precompress(root) >= 2
+    assets = Assets(root)
+    assert 'index.html.gz' not in assets.assets
+    client = await client_for(aiohttp_client, assets)
+    res = await client.get('/static/js/main.1a2b3c4d.chunk.js', headers={'Accept-Encoding': 'gzip'},
+                           auto_decompress=False)
+    assert gzip.decompress(await res.read()) == SCRIPT
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+from conductor.bank import LocalQuizSource, QuestionBank, read_results, import_dumps
+from conductor.quiz import OpenTriviaQuizSource
+from conductor.seen import SeenSet
+
+
+def result(question, category='Science', difficulty='easy'):
+    return {
+        'category': category,
+        'difficulty': difficulty,
+        'question': question,
+        'correct_answer': 'yes',
+        'incorrect_answers': ['no', 'maybe', 'never']
+    }
+
+
+def test_read_results_from_api_response():
+    dump = json.dumps({'response_code': 0, 'results': [result(f'Q{i}?') for i in range(10)]})
+    got = list(read_results(io.StringIO(dump), chunk_size=16))
+    assert [it['question'] for it in got] == [f'Q{i}?' for i in range(10)]
+
+
+def test_read_results_from_array():
+    dump = json.dumps([result('Q1?'), result('Q2?')])
+    got = list(read_results(io.StringIO(dump), chunk_size=7))
+    assert [it['question'] for it in got] == ['Q1?', 'Q2?']
+
+
+def test_add_ignores_duplicates():
+    bank = QuestionBank(':memory:')
+    assert bank.add([result('Q1?'), result('Q2?')]) == 2
+    assert bank.add([result('Q2?'), result('Q3?')]) == 1
+    assert len(bank) == 3
+
+
+def test_banks_sharing_a_file_do_not_lose_questions(tmp_path):
+    path = str(tmp_path / 'bank.db')
+    first, second = QuestionBank(path), QuestionBank(path)
+    assert first.add([result('Q1?')]) == 1
+    assert second.add([result('Q2?')]) == 1
+    assert first.add([result('Q3?')]) == 1
+    assert len(first) == len(QuestionBank(path)) == 3
+    assert {first.draw().question for _ in range(100)} == {'Q1?', 'Q2?', 'Q3?'}
+
+
+def test_draw_by_category_and_difficulty():
+    bank = QuestionBank(':memory:')
+    bank.add([result('Q1?'), result('Q2?', category='History'), result('Q3?', difficulty='hard')])
+    assert bank.draw(category='History').question == 'Q2?'
+    assert bank.draw(difficulty='hard').question == 'Q3?'
+    assert bank.draw(category='Science', difficulty='easy').question == 'Q1?'
+    assert bank.draw(category='Sports') is None
+    assert {bank.draw().question for _ in range(100)} == {'Q1?', 'Q2?', 'Q3?'}
+
+
+def test_import_dumps(tmp_path):
+    dump = tmp_path / 'dump.json'
+    dump.write_text(json.dumps({'response_code': 0, 'results': [result('Q1?'), result('Q2?')]}))
+    path = str(tmp_path / 'bank.db')
+    assert import_dumps(path, [str(dump)]) == 2
+    assert len(QuestionBank(path)) == 2
+
+
+async def test_local_quiz_source():
+    bank = QuestionBank(':memory:')
+    bank.add([result('Q1 &amp; Q2?')])
+    source = LocalQuizSource(bank)
+    quiz = await source.next()
+    assert quiz.question == 'Q1 & Q2?'
+    assert quiz.answers[quiz.answer] == 'yes'
+
+
+async def test_local_quiz_source_requires_questions():
+    source = LocalQuizSource(QuestionBank(':memory:'))
+    with pytest.raises(RuntimeError):
+        await source.next()
+
+
+async def test_fallback_to_local_source_when_open_trivia_is_unavailable():
+    bank = QuestionBank(':memory:')
+    bank.add([result('Q1?')])
+    source = OpenTriviaQuizSource(base_url='http://127.0.0.1:1', max_fetch_tentatives=1, retry_backoff_seconds=0,
+                                  cache=LocalQuizSource(bank))
+    quiz = await source.next()
+    assert quiz.question == 'Q1?'
+    await source.close()
+
+
+async def test_local_quiz_source_redraws_served_questions():
+    bank = QuestionBank(':memory:')
+    bank.add([result('Q1?'), result('Q2?')])
+    seen = SeenSet(capacity=100)
+    source = LocalQuizSource(bank, seen=seen, max_draws=50)
+    first = await source.next()
+    second = await source.next()
+    assert {first.question, second.question} == {'Q1?', 'Q2?'}
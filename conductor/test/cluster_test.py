@@ -0,0 +1,78 @@
+import asyncio
+import socket
+from unittest.mock import AsyncMock
+
+from box import Box
+
+from conductor.cluster import Router, Directory, DirectoryClient, LocalDirectory, supervise
+from conductor.rooms import RoomManager
+from conductor.server import application
+from rooms_test import room_factory
+
+
+def test_router_maps_rooms_to_workers():
+    routers = [Router(worker, workers=3, port_base=9000) for worker in range(3)]
+    for room_id in ('lobby', 'a', 'b', '42'):
+        owners = [router for router in routers if router.owns(room_id)]
+        assert len(owners) == 1
+        assert routers[0].port(room_id) == 9000 + owners[0].worker
+
+
+async def test_redirect_rooms_owned_by_other_workers(aiohttp_client):
+    router = Router(0, workers=2, port_base=9000)
+    room_id = next(room_id for room_id in map(str, range(100)) if not router.owns(room_id))
+    rooms = RoomManager(room_factory(max_sockets=2), max_rooms=2, router=router)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws = await client.ws_connect(f'/play?uid=id&room={room_id}')
+    got = await ws.receive_json()
+    assert got == Box(event='redirect', room=room_id, port=9001)
+
+
+async def test_open_only_owned_public_rooms(aiohttp_client):
+    router = Router(1, workers=2, port_base=9000)
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=3, router=router)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    sockets = [await client.ws_connect(f'/play?uid=id{i}') for i in range(3)]
+    got = [(await ws.receive_json())['room'] for ws in sockets]
+    assert all(router.owns(room_id) for room_id in got)
+
+
+async def test_list_rooms_of_local_directory(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=2), max_rooms=2)
+    directory = LocalDirectory(rooms)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock(), directory=directory))
+    ws = await client.ws_connect('/play?uid=id&room=a')
+    await ws.receive_json()
+    response = await client.get('/rooms?uid=id')
+    assert await response.json() == [{'id': 'a', 'worker': 0, 'users': ['id']}]
+
+
+async def test_directory_merges_worker_tables(tmp_path):
+    path = str(tmp_path / 'directory.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    server = await Directory().serve(sock)
+    clients = [
+        DirectoryClient(path, 0, Box(table=lambda: {'a': ['id1']}), sync_seconds=0.01),
+        DirectoryClient(path, 1, Box(table=lambda: {'b': ['id2', 'id1']}), sync_seconds=0.01),
+    ]
+    for client in clients:
+        await client.start()
+    await asyncio.sleep(0.05)
+    assert await clients[0].rooms() == [
+        {'id': 'a', 'worker': 0, 'users': ['id1']},
+        {'id': 'b', 'worker': 1, 'users': ['id2', 'id1']},
+    ]
+    assert [room['id'] for room in await clients[1].find('id2')] == ['b']
+    for client in clients:
+        await client.close()
+    server.close()
+
+
+def test_stop_cluster_when_a_worker_fails(tmp_path, caplog):
+    def run_worker(_worker):
+        raise KeyError('boom')
+
+    supervise(1, run_worker, str(tmp_path / 'cluster.sock'))
+    assert 'with status 1' in caplog.text
@@ -0,0 +1,61 @@
+import pytest
+
+from conductor import codec, messages
+from conductor.messages import Request
+
+
+def test_encode_question():
+    got = codec.BinaryCodec().encode(messages.question('Why?'))
+    assert got == b'\x00\x00\x04Why?'
+
+
+def test_intern_users_defined_by_joined():
+    encoder = codec.BinaryCodec()
+    assert encoder.encode(messages.joined('alice')) == b'\x02\x00\x00\x05alice'
+    assert encoder.encode(messages.joined('bob')) == b'\x02\x00\x01\x03bob'
+    assert encoder.encode(messages.challenged('bob')) == b'\x04\x00\x03\x01\x03'
+    assert encoder.encode(messages.lost('alice', 'timeout')) == b'\x06\x00\x02\x08timeout'
+
+
+def test_reuse_indices_of_users_who_left():
+    encoder = codec.BinaryCodec()
+    encoder.encode(messages.joined('alice'))
+    encoder.encode(messages.joined('bob'))
+    assert encoder.encode(messages.left('alice')) == b'\x03\x00\x02'
+    assert encoder.encode(messages.lost('alice')) == b'\x06\x00\x01\x05alice\x00'
+    assert encoder.encode(messages.joined('carol')) == b'\x02\x00\x00\x05carol'
+    assert encoder.encode(messages.joined('dave')) == b'\x02\x00\x02\x04dave'
+    assert encoder.uids == {'bob': 1, 'carol': 0, 'dave': 2}
+
+
+def test_inline_unknown_users():
+    got = codec.BinaryCodec().encode(messages.left('carol'))
+    assert got == b'\x03\x00\x01\x05carol'
+
+
+def test_encode_snapshot():
+    encoder = codec.BinaryCodec()
+    got = encoder.encode(messages.snapshot(question=None, users=['a', 'b'], lost=['b'], challenged=None))
+    assert got == b'\x01\x00\x00\x02\x00\x01a\x01\x01b\x01\x03\x00'
+
+
+def test_encode_reply_and_end():
+    encoder = codec.BinaryCodec()
+    assert encoder.encode(messages.reply(['x', 'yz'], timeout=300)) == b'\x05\x00\x02\x01x\x02yz\xac\x02'
+    assert encoder.encode(messages.end(None, answer=1)) == b'\x07\x00\x00\x01'
+
+
+def test_encode_sequence_number():
+    got = codec.BinaryCodec().encode(messages.question('Why?'), seq=1)
+    assert got == b'\x00\x02\x04Why?'
+
+
+def test_decode_requests():
+    assert codec.decode_request(bytes([codec.CHALLENGE])) == Request(action='challenge')
+    assert codec.decode_request(bytes([codec.ANSWER, 2])) == Request(answer=2)
+    with pytest.raises(ValueError):
+        codec.decode_request(b'\x09')
+
+
+def test_encode_batch():
+    assert codec.encode_batch([b'\x00\x02\x02Q?', b'\x07\x03\x00\x01']) == b'\x7f\x02\x00\x02\x02Q?\x07\x03\x00\x01'
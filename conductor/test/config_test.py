@@ -0,0 +1,12 @@
+import importlib
+
+from conductor import config
+
+
+def test_parse_log_sampling_rates(monkeypatch):
+    monkeypatch.setenv('LOG_SAMPLING', 'frames=0.01,game=1')
+    try:
+        assert importlib.reload(config).log_sampling == {'frames': 0.01, 'game': 1.0}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
@@ -1,11 +1,12 @@
 import asyncio
 from itertools import cycle
-from unittest.mock import AsyncMock, call
+from unittest.mock import AsyncMock, Mock, call
 from box import Box
 
 from conductor import messages
 from conductor.game import Conductor
 from conductor.network import Message
+from conductor.results import question_id
 
 
 class UserEmulator:
@@ -43,7 +44,7 @@ async def test_single_player_game():
     mario = UserEmulator(conductor=conductor, net=net, uid='mario')
     await mario.enter()
     net.publish.assert_called_with(messages.joined('mario'))
-    net.send.assert_called_with('mario', messages.question('1+2?'))
+    net.send.assert_called_with('mario', messages.encode(messages.snapshot('1+2?', users=[], lost=[], challenged=None)))
     net.reset_mock()
     await mario.challenge(answer=MockQuizSource.good_answer)
     net.send.assert_called_with('mario', messages.reply(['1', '2', '3', '4'], timeout=3))
@@ -163,6 +164,77 @@ async def test_ignore_other_challenges_during_challenge():
     ])
 
 
+async def test_earliest_received_challenge_wins_the_window():
+    net = AsyncMock()
+    net.receive.return_value = Message(user='luigi', body=Box(answer=MockQuizSource.good_answer))
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+        challenge_window_seconds=0.05,
+    )
+    await conductor.on_enter(net, 'mario')
+    await conductor.on_enter(net, 'luigi')
+    net.publish.reset_mock()
+    await asyncio.gather(
+        conductor.on_message(net, Message(user='mario', body=Box(action='challenge'), received_at=2.0)),
+        conductor.on_message(net, Message(user='luigi', body=Box(action='challenge'), received_at=1.0)),
+    )
+    net.receive.assert_called_once_with('luigi', timeout=5)
+    net.publish.assert_has_calls([
+        call(messages.challenged('luigi', ['luigi', 'mario'])),
+        call(messages.end('luigi', answer=MockQuizSource.good_answer))
+    ])
+
+
+async def test_ignore_challenges_received_before_the_winner_begins():
+    async def slow_timeout(*_args, **_kwargs):
+        await asyncio.sleep(0.1)
+        raise asyncio.TimeoutError()
+
+    net = AsyncMock()
+    net.receive.side_effect = slow_timeout
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+        challenge_window_seconds=0.05,
+    )
+    for user in ('mario', 'luigi', 'peach'):
+        await conductor.on_enter(net, user)
+
+    async def mario_then_peach():
+        await conductor.on_message(net, Message(user='mario', body=Box(action='challenge'), received_at=2.0))
+        await conductor.on_message(net, Message(user='peach', body=Box(action='challenge'), received_at=3.0))
+
+    await asyncio.gather(
+        mario_then_peach(),
+        conductor.on_message(net, Message(user='luigi', body=Box(action='challenge'), received_at=1.0)),
+    )
+    net.receive.assert_called_once_with('luigi', timeout=5)
+
+
+async def test_compensate_challenge_receive_time_with_rtt():
+    net = AsyncMock()
+    net.rtt = Mock(side_effect={'mario': 0.02, 'luigi': 0.2}.get)
+    net.receive.side_effect = asyncio.TimeoutError()
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+        challenge_window_seconds=0.05,
+        rtt_compensation=True,
+    )
+    await conductor.on_enter(net, 'mario')
+    await conductor.on_enter(net, 'luigi')
+    net.publish.reset_mock()
+    await asyncio.gather(
+        conductor.on_message(net, Message(user='mario', body=Box(action='challenge'), received_at=1.0)),
+        conductor.on_message(net, Message(user='luigi', body=Box(action='challenge'), received_at=1.03)),
+    )
+    net.publish.assert_any_call(messages.challenged('luigi', ['luigi', 'mario']))
+
+
 async def test_other_user_can_try_after_failed_challenge():
     net = AsyncMock()
     conductor = Conductor(
@@ -213,12 +285,56 @@ async def test_conductor_reply_events_when_new_user_join():
     await mario.challenge(answer=MockQuizSource.bad_answer)
     net.send.reset_mock()
     await luigi.challenge(answer=MockQuizSource.good_answer, meanwhile=lambda: peach.enter())
-    net.send.assert_has_calls([
-        call('peach', messages.joined('mario')),
-        call('peach', messages.lost('mario')),
-        call('peach', messages.joined('luigi')),
-        call('peach', messages.challenged('luigi'))
-    ], any_order=True)
+    net.send.assert_called_with('peach', messages.encode(messages.snapshot(
+        '1+2?', users=['mario', 'luigi'], lost=['mario'], challenged='luigi')))
+
+
+async def test_snapshot_is_reused_until_session_changes():
+    net = AsyncMock()
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+    )
+    mario = UserEmulator(conductor=conductor, net=net, uid='mario')
+    await mario.enter()
+    snapshot = conductor.session.snapshot()
+    assert conductor.session.snapshot() is snapshot
+    await mario.challenge(answer=MockQuizSource.bad_answer)
+    assert conductor.session.snapshot() is not snapshot
+
+
+async def test_send_snapshot_on_resume():
+    net = AsyncMock()
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+    )
+    mario = UserEmulator(conductor=conductor, net=net, uid='mario')
+    await mario.enter()
+    net.reset_mock()
+    await conductor.on_resume(net, 'mario')
+    net.send.assert_called_with('mario', conductor.session.snapshot())
+    net.publish.assert_not_called()
+
+
+async def test_accept_challenges_only_when_nobody_is_challenging():
+    net = AsyncMock()
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+    )
+    mario = UserEmulator(conductor=conductor, net=net, uid='mario')
+    await mario.enter()
+    assert conductor.accepts('mario', 'challenge')
+    conductor.session.begin_challenge('luigi')
+    assert not conductor.accepts('mario', 'challenge')
+    assert conductor.accepts('mario', 'answer')
+    conductor.session.end_challenge()
+    conductor.session.kill_user('mario')
+    assert not conductor.accepts('mario', 'challenge')
 
 
 async def test_end_game_when_all_users_lose():
@@ -237,6 +353,28 @@ async def test_end_game_when_all_users_lose():
     net.publish.assert_any_call(messages.end(winner=None, answer=MockQuizSource.good_answer))
 
 
+async def test_record_round_results():
+    net = AsyncMock()
+    results = Mock()
+    conductor = Conductor(
+        quiz_source=MockQuizSource(),
+        challenge_timeout_seconds=5,
+        seconds_before_new_session=0,
+        results=results,
+        room='r1',
+    )
+    mario = UserEmulator(conductor=conductor, net=net, uid='mario')
+    luigi = UserEmulator(conductor=conductor, net=net, uid='luigi')
+    await mario.enter()
+    await luigi.enter()
+    await mario.challenge(answer=MockQuizSource.bad_answer)
+    await luigi.challenge(answer=MockQuizSource.good_answer)
+    result = results.record.call_args.args[0]
+    assert (result.room, result.question, result.winner) == ('r1', question_id('1+2?'), 'luigi')
+    assert result.losses == {'mario': 'incorrect'}
+    assert result.challenge_seconds >= 0
+
+
 async def test_new_session_is_created_after_end():
     net = AsyncMock()
     conductor = Conductor(
@@ -246,7 +384,7 @@ async def test_new_session_is_created_after_end():
     )
     mario = UserEmulator(conductor=conductor, net=net, uid='mario')
     await mario.enter()
-    net.send.assert_any_call('mario', messages.question('1+2?'))
+    net.send.assert_any_call('mario', messages.encode(messages.snapshot('1+2?', users=[], lost=[], challenged=None)))
     await mario.challenge(answer=MockQuizSource.bad_answer)
     net.publish.assert_any_call(messages.question('2+1?'))
 
@@ -0,0 +1,68 @@
+from unittest.mock import AsyncMock
+
+from aiohttp import WSCloseCode, WSMsgType
+from box import Box
+
+from conductor import handoff
+from conductor.game import Conductor
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.rooms import Room, RoomManager
+from conductor.server import application
+
+
+class QuizSource:
+    async def next(self):
+        return Box(question='Q?', answers=['yes', 'no'], answer=0)
+
+
+def new_room(room_id):
+    conductor = Conductor(QuizSource(), challenge_timeout_seconds=5, seconds_before_new_session=0)
+    network = Network(SocketRegistry(max_sockets=2), on_enter=conductor.on_enter, on_message=conductor.on_message,
+                      on_exit=conductor.on_exit, on_resume=conductor.on_resume, room=room_id,
+                      resume_grace_seconds=5)
+    return Room(room_id, network, conductor)
+
+
+async def test_resume_game_in_new_process(aiohttp_client, tmp_path):
+    path = str(tmp_path / 'sessions')
+    rooms = RoomManager(new_room, max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=alice&room=r')
+    ready = Box(await ws.receive_json())
+    await ws.receive_json()  # receive snapshot event
+    joined = Box(await ws.receive_json())
+    rooms.drain()
+    handoff.save(path, rooms)
+    await rooms.close()
+    msg = await ws.receive()
+    assert msg.type == WSMsgType.CLOSE
+    assert msg.data == WSCloseCode.SERVICE_RESTART
+
+    restored = RoomManager(new_room, max_rooms=1)
+    assert handoff.restore(path, restored, max_age_seconds=30) == 1
+    client = await aiohttp_client(application(restored, shutdown=AsyncMock()))
+    ws = await client.ws_connect(f'/play?uid=alice&room=r&token={ready.token}&seq={joined.seq}')
+    got = Box(await ws.receive_json())
+    assert (got.event, got.token, got.seq) == ('ready', ready.token, 1)
+    got = await ws.receive_json()
+    assert got == Box(event='snapshot', question='Q?', users=['alice'], lost=[], challenged=None)
+    await restored.close()
+
+
+async def test_close_new_sockets_while_draining(aiohttp_client):
+    rooms = RoomManager(new_room, max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    rooms.drain()
+    ws = await client.ws_connect('/play?uid=alice')
+    msg = await ws.receive()
+    assert msg.type == WSMsgType.CLOSE
+    assert msg.data == WSCloseCode.SERVICE_RESTART
+
+
+async def test_skip_old_snapshots(tmp_path):
+    path = str(tmp_path / 'sessions')
+    rooms = RoomManager(new_room, max_rooms=1)
+    handoff.save(path, rooms)
+    assert handoff.restore(path, RoomManager(new_room, max_rooms=1), max_age_seconds=-1) == 0
+    assert not (tmp_path / 'sessions').exists()
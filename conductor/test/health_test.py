@@ -0,0 +1,39 @@
+from unittest.mock import AsyncMock
+
+from conductor import health
+from conductor.health import Health
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.server import application
+
+
+async def test_ready_only_after_warm_up(aiohttp_client):
+    checks = Health()
+    client = await aiohttp_client(application(AsyncMock(), shutdown=AsyncMock(), health=checks))
+    assert (await client.get('/healthz')).status == 200
+    assert (await client.get('/readyz')).status == 503
+    checks.set_ready()
+    assert (await client.get('/readyz')).status == 200
+    assert health.startup_seconds.value > 0
+    checks.set_ready(False)
+    assert (await client.get('/readyz')).status == 503
+
+
+async def test_measure_first_connection(aiohttp_client):
+    checks = Health(started=0)
+    network = Network(SocketRegistry(max_sockets=1))
+    client = await aiohttp_client(application(network, shutdown=AsyncMock(), health=checks))
+    await client.get('/healthz')
+    assert not checks.connected
+    await client.ws_connect('/play?uid=id')
+    assert checks.connected
+    assert health.first_connection_seconds.value > 0
+
+
+async def test_ready_even_if_warm_up_fails():
+    async def fail():
+        raise KeyError('token')
+
+    checks = Health()
+    await checks.warm_up(fail())
+    assert checks.ready
@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from conductor.heartbeat import Heartbeat, TimerWheel
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.server import application
+
+
+def test_timer_wheel_expires_keys_after_ticks():
+    wheel = TimerWheel(slots=4)
+    wheel.schedule('a', 1)
+    wheel.schedule('b', 3)
+    wheel.schedule('c', 6)
+    assert wheel.advance() == ['a']
+    assert wheel.advance() == []
+    assert wheel.advance() == ['b']
+    assert wheel.advance() == []
+    assert wheel.advance() == []
+    assert wheel.advance() == ['c']
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_reschedule_and_cancel():
+    wheel = TimerWheel(slots=4)
+    wheel.schedule('a', 1)
+    wheel.schedule('a', 2)
+    wheel.schedule('b', 2)
+    wheel.cancel('b')
+    assert wheel.advance() == []
+    assert wheel.advance() == ['a']
+
+
+async def keep_receiving(ws):
+    async for _msg in ws:
+        pass
+
+
+async def connect(aiohttp_client, heartbeat, on_exit):
+    network = Network(SocketRegistry(max_sockets=1), on_exit=on_exit, heartbeat=heartbeat)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    heartbeat.start()
+    return network, client
+
+
+async def test_evict_sockets_not_answering_pings(aiohttp_client):
+    on_exit = AsyncMock()
+    heartbeat = Heartbeat(interval_seconds=0.05, timeout_seconds=0.05, tick_seconds=0.01)
+    network, client = await connect(aiohttp_client, heartbeat, on_exit)
+    await client.ws_connect('/play?uid=id', autoping=False)
+    await asyncio.sleep(0.3)
+    on_exit.assert_called_with(network, 'id')
+    assert network.registry.is_empty()
+    await heartbeat.close()
+
+
+async def test_keep_sockets_answering_pings(aiohttp_client):
+    on_exit = AsyncMock()
+    heartbeat = Heartbeat(interval_seconds=0.05, timeout_seconds=0.05, tick_seconds=0.01)
+    network, client = await connect(aiohttp_client, heartbeat, on_exit)
+    ws = await client.ws_connect('/play?uid=id')
+    receiving = asyncio.ensure_future(keep_receiving(ws))
+    await asyncio.sleep(0.3)
+    on_exit.assert_not_called()
+    assert not network.registry.is_empty()
+    assert network.rtt('id') > 0
+    receiving.cancel()
+    await heartbeat.close()
+
+
+async def test_evict_idle_sockets(aiohttp_client):
+    on_exit = AsyncMock()
+    heartbeat = Heartbeat(interval_seconds=0.05, timeout_seconds=0.05, idle_timeout_seconds=0.1, tick_seconds=0.01)
+    network, client = await connect(aiohttp_client, heartbeat, on_exit)
+    ws = await client.ws_connect('/play?uid=id')
+    receiving = asyncio.ensure_future(keep_receiving(ws))
+    await asyncio.sleep(0.3)
+    on_exit.assert_called_with(network, 'id')
+    receiving.cancel()
+    await heartbeat.close()
@@ -0,0 +1,99 @@
+from unittest.mock import AsyncMock
+
+import aiohttp
+from box import Box
+import pytest
+
+from conductor.lobby import Lobby
+from conductor.metrics import Histogram
+from conductor.ratelimit import RateLimiter
+from conductor.rooms import RoomManager
+from conductor.server import application
+from rooms_test import room_factory
+
+
+def lobby(max_size, round_seconds=10):
+    return Lobby(max_size, Histogram('test_round_seconds', ''), default_round_seconds=round_seconds)
+
+
+async def test_wait_in_lobby_until_a_seat_frees(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1, lobby=lobby(max_size=2))
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=id1&room=a')
+    await ws1.receive_json()  # receive ready event
+    ws2 = await client.ws_connect('/play?uid=id2&room=a')
+    assert await ws2.receive_json(timeout=1) == Box(event='queued', position=1, wait=10)
+    await ws1.close()
+    got = await ws2.receive_json(timeout=1)
+    assert got['event'] == 'ready'
+    assert got['room'] == 'a'
+
+
+async def test_queue_players_with_unknown_tokens(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1, lobby=lobby(max_size=2))
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=id1&room=a')
+    await ws1.receive_json()  # receive ready event
+    ws2 = await client.ws_connect('/play?uid=id2&room=a')
+    await ws2.receive_json()  # receive queued event
+    ws3 = await client.ws_connect('/play?uid=id3&room=a&token=bogus')
+    assert await ws3.receive_json(timeout=1) == Box(event='queued', position=2, wait=20)
+    await ws1.close()
+    got = await ws2.receive_json(timeout=1)
+    while got['event'] == 'queued':
+        got = await ws2.receive_json(timeout=1)
+    assert got['event'] == 'ready'
+
+
+async def test_update_positions_when_players_leave_the_lobby(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1, lobby=lobby(max_size=2))
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=id1')
+    await ws1.receive_json()  # receive ready event
+    ws2 = await client.ws_connect('/play?uid=id2')
+    assert (await ws2.receive_json(timeout=1))['position'] == 1
+    ws3 = await client.ws_connect('/play?uid=id3')
+    assert (await ws3.receive_json(timeout=1))['position'] == 2
+    await ws2.close()
+    assert await ws3.receive_json(timeout=1) == Box(event='queued', position=1, wait=10)
+
+
+async def test_reject_when_lobby_is_full(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1, lobby=lobby(max_size=1))
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=id1')
+    await ws1.receive_json()  # receive ready event
+    ws2 = await client.ws_connect('/play?uid=id2')
+    await ws2.receive_json()  # receive queued event
+    ws3 = await client.ws_connect('/play?uid=id3')
+    assert await ws3.receive_json(timeout=1) == Box(event='rejected', reason='lobbyFull')
+
+
+def test_estimate_wait_from_observed_rounds():
+    rounds = Histogram('test_round_seconds', '')
+    rounds.observe(20)
+    rounds.observe(40)
+    waiting = Lobby(10, rounds)
+    assert waiting._mean_round_seconds() == 30
+
+
+async def test_rate_limit_connections(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=10), max_rooms=1)
+    limiter = RateLimiter(rate=0.001, burst=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock(), limiter=limiter))
+    await client.ws_connect('/play?uid=id1')
+    with pytest.raises(aiohttp.WSServerHandshakeError) as error:
+        await client.ws_connect('/play?uid=id2')
+    assert error.value.status == 429
+
+
+async def test_rate_limit_connections_by_forwarded_address(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=10), max_rooms=1)
+    limiter = RateLimiter(rate=0.001, burst=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock(), limiter=limiter,
+                                              address_header='X-Forwarded-For'))
+    await client.ws_connect('/play?uid=id1', headers={'X-Forwarded-For': '10.0.0.1'})
+    await client.ws_connect('/play?uid=id2', headers={'X-Forwarded-For': '10.0.0.9, 10.0.0.2'})
+    with pytest.raises(aiohttp.WSServerHandshakeError) as error:
+        await client.ws_connect('/play?uid=id3', headers={'X-Forwarded-For': '10.0.0.2'})
+    assert error.value.status == 429
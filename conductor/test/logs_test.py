@@ -0,0 +1,82 @@
+import asyncio
+import json
+import logging
+from logging.handlers import QueueListener
+import queue
+
+from conductor import logs
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_sample_debug_lines_by_category():
+    sampling = logs.SamplingFilter({'frames': 0.5}, random_source=iter([0.1, 0.9, 0.4]).__next__)
+    frame = logging.makeLogRecord({'name': 'conductor.frames', 'levelno': logging.DEBUG})
+    other = logging.makeLogRecord({'name': 'conductor.network', 'levelno': logging.DEBUG})
+    warning = logging.makeLogRecord({'name': 'conductor.frames', 'levelno': logging.WARNING})
+    assert [sampling.filter(frame) for _ in range(3)] == [True, False, True]
+    assert sampling.filter(other)
+    assert sampling.filter(warning)
+
+
+async def test_records_carry_room_and_uid_of_the_task():
+    context = logs.ContextFilter()
+
+    async def serve(room_id, user):
+        logs.bind(room_id, user)
+        await asyncio.sleep(0)
+        record = logging.makeLogRecord({})
+        context.filter(record)
+        return record.room, record.uid
+
+    got = await asyncio.gather(asyncio.ensure_future(serve('r1', 'alice')), asyncio.ensure_future(serve('r2', 'bob')))
+    assert got == [('r1', 'alice'), ('r2', 'bob')]
+
+
+def test_format_json_lines():
+    record = logging.makeLogRecord({'name': 'conductor', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': 'hello %s', 'args': ('world',), 'room': 'r1', 'uid': 'alice'})
+    line = json.loads(logs.JsonFormatter().format(record))
+    assert line['message'] == 'hello world'
+    assert (line['room'], line['uid'], line['level']) == ('r1', 'alice', 'INFO')
+
+
+def test_write_records_from_a_background_thread():
+    records = Records()
+    handler = logs.RecordQueueHandler(queue.SimpleQueue())
+    listener = QueueListener(handler.queue, records)
+    listener.start()
+    logger = logging.getLogger('conductor.test')
+    logger.addHandler(handler)
+    try:
+        logger.error('failed %s', 'once')
+    finally:
+        logger.removeHandler(handler)
+        listener.stop()
+    assert [record.getMessage() for record in records.records] == ['failed once']
+
+
+def test_write_queued_records_when_stopping(capsys):
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    try:
+        listener = logs.setup(logging.INFO)
+        logging.info('before stopping')
+        logs.stop(listener)
+        logging.info('after stopping')
+    finally:
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+    err = capsys.readouterr().err
+    assert 'before stopping' in err
+    assert 'after stopping' in err
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from conductor import messages
+from conductor.messages import Request
+
+
+def test_encode_keeps_protocol_shape():
+    frame = messages.encode(messages.lost('mario', 'timeout'))
+    assert frame == '{"event":"lost","user":"mario","reason":"timeout"}'
+    assert frame.key == 'lost'
+
+
+def test_encode_snapshot():
+    frame = messages.encode(messages.snapshot('1+2?', users=['a'], lost=[], challenged=None))
+    assert json.loads(frame) == {'event': 'snapshot', 'question': '1+2?', 'users': ['a'], 'lost': [], 'challenged': None}
+
+
+def test_encode_snapshot_from_encoded_users():
+    users = {user: messages.dumps(user) for user in ('a', 'b"c', 'è')}
+    lost = {'a': messages.dumps('a')}
+    frame = messages.encode_snapshot('1+2?', users, lost, challenged='è')
+    assert frame == messages.encode(messages.snapshot('1+2?', users=list(users), lost=['a'], challenged='è'))
+    assert frame.body == messages.snapshot('1+2?', users=list(users), lost=['a'], challenged='è')
+
+
+def test_encode_plain_dict():
+    frame = messages.encode({'event': 'ready'})
+    assert frame == '{"event":"ready"}'
+    assert frame.key == 'ready'
+
+
+def test_events_compare_by_value():
+    assert messages.end('mario', answer=1) == messages.end('mario', answer=1)
+    assert messages.end('mario', answer=1) != messages.end('luigi', answer=1)
+    assert messages.joined('mario') != messages.left('mario')
+
+
+def test_parse_requests():
+    assert Request.parse({'action': 'challenge'}) == Request(action='challenge')
+    assert Request.parse({'answer': 2}).answer == 2
+    assert Request.parse({'answer': 2}).to_json() == {'answer': 2}
+
+
+@pytest.mark.parametrize('data', [[], {'action': 'cheat'}, {'answer': '1'}, {'answer': -1}, {'answer': True}])
+def test_reject_invalid_requests(data):
+    with pytest.raises(ValueError):
+        Request.parse(data)
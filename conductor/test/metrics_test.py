@@ -0,0 +1,49 @@
+from unittest.mock import AsyncMock
+
+from conductor import metrics
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.server import application
+
+
+def test_render_counter():
+    counter = metrics.Counter('test_total', 'A counter')
+    counter.inc()
+    counter.inc(2)
+    assert list(counter.samples()) == [('test_total', '', 3)]
+
+
+def test_render_labeled_counter():
+    counter = metrics.LabeledCounter('test_total', 'A counter', label='reason')
+    counter.inc('b')
+    counter.inc('a')
+    counter.inc('b')
+    assert list(counter.samples()) == [('test_total', '{reason="a"}', 1), ('test_total', '{reason="b"}', 2)]
+
+
+def test_render_histogram():
+    histogram = metrics.Histogram('test_seconds', 'A histogram', buckets=(1, 5))
+    histogram.observe(0.5)
+    histogram.observe(3)
+    histogram.observe(10)
+    assert list(histogram.samples()) == [
+        ('test_seconds_bucket', '{le="1"}', 1),
+        ('test_seconds_bucket', '{le="5"}', 2),
+        ('test_seconds_bucket', '{le="+Inf"}', 3),
+        ('test_seconds_sum', '', 13.5),
+        ('test_seconds_count', '', 3),
+    ]
+
+
+async def test_metrics_endpoint(aiohttp_client):
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    await client.ws_connect('/play?uid=id')
+    ws = await client.ws_connect('/play?uid=id')
+    await ws.receive_json()
+    res = await client.get('/metrics')
+    assert res.status == 200
+    text = await res.text()
+    assert '# TYPE conductor_active_sockets gauge' in text
+    assert 'conductor_rejections_total{reason="maxSocketsReached"}' in text
@@ -1,9 +1,11 @@
+import asyncio
 from unittest.mock import AsyncMock
 
 import aiohttp
 from box import Box
 import pytest
 
+from conductor import codec, messages
 from conductor.network import Network
 from conductor.registry import SocketRegistry
 from conductor.server import application
@@ -43,7 +45,8 @@ async def test_send_ready_event_after_connection(aiohttp_client):
     client = await aiohttp_client(application(network, shutdown=AsyncMock()))
     ws = await client.ws_connect('/play?uid=id')
     got = await ws.receive_json()
-    assert got == Box(event='ready')
+    assert got.keys() == {'event', 'token', 'seq'}
+    assert got['event'] == 'ready'
 
 
 async def test_enter_event(aiohttp_client):
@@ -64,9 +67,9 @@ async def test_send(aiohttp_client):
     client = await aiohttp_client(application(network, shutdown=AsyncMock()))
     ws = await client.ws_connect('/play?uid=name')
     await ws.receive_json()  # receive ready event
-    await ws.send_json(Box(x=1))
+    await ws.send_json(Box(answer=1))
     got = await ws.receive_json(timeout=3)
-    assert got == Box(x=1)
+    assert got == Box(answer=1)
 
 
 async def test_publish(aiohttp_client):
@@ -80,11 +83,86 @@ async def test_publish(aiohttp_client):
     ws2 = await client.ws_connect('/play?uid=name2')
     await ws1.receive_json()  # receive ready event
     await ws2.receive_json()  # receive ready event
-    await ws1.send_json(Box(x=1))
+    await ws1.send_json(Box(answer=1))
     got = await ws1.receive_json(timeout=1)
-    assert got == Box(x=1)
+    assert got == Box(answer=1, seq=1)
     got = await ws2.receive_json(timeout=1)
-    assert got == Box(x=1)
+    assert got == Box(answer=1, seq=1)
+
+
+async def test_publish_encoded_frame(aiohttp_client):
+    async def broadcast_frame(net, message):
+        await net.publish(messages.encode(message.body))
+
+    registry = SocketRegistry(max_sockets=2)
+    network = Network(registry, on_message=broadcast_frame)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=name1')
+    ws2 = await client.ws_connect('/play?uid=name2')
+    await ws1.receive_json()  # receive ready event
+    await ws2.receive_json()  # receive ready event
+    await ws1.send_json(Box(answer=1))
+    got = await ws1.receive_json(timeout=1)
+    assert got == Box(answer=1, seq=1)
+    got = await ws2.receive_json(timeout=1)
+    assert got == Box(answer=1, seq=1)
+
+
+async def test_binary_encoding(aiohttp_client):
+    async def challenged(net, message):
+        assert message.body == messages.Request(action='challenge')
+        await net.publish(messages.challenged(message.user))
+
+    registry = SocketRegistry(max_sockets=2)
+    network = Network(registry, on_message=challenged)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=name1&encoding=binary')
+    ws2 = await client.ws_connect('/play?uid=name2')
+    await ws1.receive_json()  # receive ready event
+    await ws2.receive_json()  # receive ready event
+    await ws1.send_bytes(bytes([codec.CHALLENGE]))
+    got = await ws1.receive_bytes(timeout=1)
+    assert got == b'\x04\x02\x01\x05name1\x01\x01\x05name1'
+    got = await ws2.receive_json(timeout=1)
+    assert got == Box(event='challenged', user='name1', contenders=['name1'], seq=1)
+
+
+async def test_coalesce_events_published_in_a_tick(aiohttp_client):
+    async def burst(net, message):
+        await net.publish(messages.challenged(message.user))
+        await net.publish(messages.lost(message.user, 'timeout'))
+        await net.send(message.user, messages.question('Q?'))
+        await net.publish(messages.end(None, 1))
+
+    registry = SocketRegistry(max_sockets=2)
+    network = Network(registry, on_message=burst, coalesce_seconds=0)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=name1&encoding=binary')
+    ws2 = await client.ws_connect('/play?uid=name2')
+    await ws1.receive_json()  # receive ready event
+    await ws2.receive_json()  # receive ready event
+    await ws1.send_bytes(bytes([codec.CHALLENGE]))
+    got = await ws1.receive_bytes(timeout=1)
+    assert got == b'\x7f\x02\x04\x02\x01\x05name1\x01\x01\x05name1\x06\x03\x01\x05name1\x08timeout'
+    got = await ws1.receive_bytes(timeout=1)
+    assert got == b'\x00\x00\x02Q?'
+    got = await ws1.receive_bytes(timeout=1)
+    assert got == b'\x07\x04\x00\x01'
+    got = await ws2.receive_json(timeout=1)
+    assert got == [
+        Box(event='challenged', user='name1', contenders=['name1'], seq=1),
+        Box(event='lost', user='name1', reason='timeout', seq=2)
+    ]
+    got = await ws2.receive_json(timeout=1)
+    assert got == Box(event='end', winner=None, answer=1, seq=3)
+
+
+async def test_reject_unknown_encoding(aiohttp_client):
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    with pytest.raises(aiohttp.WSServerHandshakeError):
+        await client.ws_connect('/play?uid=id&encoding=xml')
 
 
 async def test_exit_event(aiohttp_client):
@@ -95,3 +173,149 @@ async def test_exit_event(aiohttp_client):
     ws = await client.ws_connect('/play?uid=name')
     await ws.close()
     on_exit.assert_called_with(network, 'name')
+
+
+async def connect_resumable(aiohttp_client, on_exit=AsyncMock(), on_resume=AsyncMock(), event_log_size=64):
+    async def broadcast_echo(net, message):
+        await net.publish(message.body)
+
+    registry = SocketRegistry(max_sockets=2)
+    network = Network(registry, on_message=broadcast_echo, on_exit=on_exit, on_resume=on_resume,
+                      resume_grace_seconds=0.2, event_log_size=event_log_size)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    return network, client
+
+
+async def test_resume_replays_missed_events(aiohttp_client):
+    on_exit = AsyncMock()
+    network, client = await connect_resumable(aiohttp_client, on_exit=on_exit)
+    ws1 = await client.ws_connect('/play?uid=name1')
+    ws2 = await client.ws_connect('/play?uid=name2')
+    ready = await ws1.receive_json()
+    await ws2.receive_json()
+    await ws1.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+    await ws2.send_json(Box(answer=1))
+    await ws2.send_json(Box(answer=2))
+    assert (await ws2.receive_json(timeout=1))['seq'] == 1
+    assert (await ws2.receive_json(timeout=1))['seq'] == 2
+    ws1 = await client.ws_connect(f'/play?uid=name1&token={ready["token"]}&seq=1')
+    got = await ws1.receive_json(timeout=1)
+    assert got['event'] == 'ready' and got['token'] == ready['token'] and got['seq'] == 2
+    got = await ws1.receive_json(timeout=1)
+    assert got == Box(answer=2, seq=2)
+    on_exit.assert_not_called()
+
+
+async def test_resume_sends_snapshot_when_log_is_too_short(aiohttp_client):
+    on_resume = AsyncMock()
+    network, client = await connect_resumable(aiohttp_client, on_resume=on_resume, event_log_size=1)
+    ws1 = await client.ws_connect('/play?uid=name1')
+    ws2 = await client.ws_connect('/play?uid=name2')
+    ready = await ws1.receive_json()
+    await ws2.receive_json()
+    await ws1.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+    await ws2.send_json(Box(answer=1))
+    await ws2.send_json(Box(answer=2))
+    await ws2.receive_json(timeout=1)
+    await ws2.receive_json(timeout=1)
+    ws1 = await client.ws_connect(f'/play?uid=name1&token={ready["token"]}&seq=0')
+    await ws1.receive_json(timeout=1)
+    on_resume.assert_called_with(network, 'name1')
+
+
+async def test_exit_after_grace_window(aiohttp_client):
+    on_exit = AsyncMock()
+    network, client = await connect_resumable(aiohttp_client, on_exit=on_exit)
+    ws = await client.ws_connect('/play?uid=name')
+    ready = await ws.receive_json()
+    await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+    ws = await client.ws_connect('/play?uid=name')
+    assert await ws.receive_json() == Box(event='rejected', reason='usernameNotAvailable')
+    await asyncio.sleep(0.3)
+    on_exit.assert_called_with(network, 'name')
+    ws = await client.ws_connect(f'/play?uid=name&token={ready["token"]}')
+    got = await ws.receive_json()
+    assert got['event'] == 'ready' and got['token'] != ready['token']
+
+
+async def test_resume_replaces_stale_socket(aiohttp_client):
+    on_exit = AsyncMock()
+    network, client = await connect_resumable(aiohttp_client, on_exit=on_exit)
+    ws1 = await client.ws_connect('/play?uid=name')
+    ready = await ws1.receive_json()
+    ws2 = await client.ws_connect(f'/play?uid=name&token={ready["token"]}&seq=0')
+    got = await ws2.receive_json(timeout=1)
+    assert got['event'] == 'ready'
+    on_exit.assert_not_called()
+
+
+async def test_leave_at_once_on_normal_close(aiohttp_client):
+    on_exit = AsyncMock()
+    network, client = await connect_resumable(aiohttp_client, on_exit=on_exit)
+    ws = await client.ws_connect('/play?uid=name')
+    await ws.receive_json()
+    await ws.close()
+    await asyncio.sleep(0.05)
+    on_exit.assert_called_with(network, 'name')
+
+
+async def test_drop_requests_over_the_limit(aiohttp_client):
+    on_message = AsyncMock()
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry, on_message=on_message, request_limits={'challenge': (0.001, 2)})
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=name')
+    await ws.receive_json()  # receive ready event
+    for _ in range(4):
+        await ws.send_json(Box(action='challenge'))
+    await ws.send_json(Box(answer=1))
+    await asyncio.sleep(0.05)
+    assert [c.args[1].body for c in on_message.call_args_list] == [
+        messages.Request(action='challenge'),
+        messages.Request(action='challenge'),
+        messages.Request(answer=1),
+    ]
+
+
+async def test_close_sockets_exceeding_violations(aiohttp_client):
+    on_exit = AsyncMock()
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry, on_exit=on_exit, request_limits={'other': (0.001, 1)}, max_violations=2,
+                      resume_grace_seconds=1)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=name')
+    await ws.receive_json()  # receive ready event
+    for _ in range(3):
+        await ws.send_json(Box(x=1))
+    msg = await ws.receive(timeout=1)
+    assert msg.type == aiohttp.WSMsgType.CLOSE
+    assert msg.data == aiohttp.WSCloseCode.POLICY_VIOLATION
+    await asyncio.sleep(0.05)
+    on_exit.assert_called_with(network, 'name')
+
+
+async def test_close_sockets_flooding_challenges_during_other_challenge(aiohttp_client):
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry, accepts=lambda _user, kind: kind != 'challenge',
+                      request_limits={'challenge': (0.001, 2)}, max_violations=2)
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=name')
+    await ws.receive_json()  # receive ready event
+    for _ in range(4):
+        await ws.send_json(Box(action='challenge'))
+    msg = await ws.receive(timeout=1)
+    assert msg.type == aiohttp.WSMsgType.CLOSE
+    assert msg.data == aiohttp.WSCloseCode.POLICY_VIOLATION
+
+
+async def test_drop_requests_not_accepted(aiohttp_client):
+    on_message = AsyncMock()
+    registry = SocketRegistry(max_sockets=1)
+    network = Network(registry, on_message=on_message, accepts=lambda _user, kind: kind != 'challenge')
+    client = await aiohttp_client(application(network, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=name')
+    await ws.receive_json()  # receive ready event
+    await ws.send_json(Box(action='challenge'))
+    await ws.send_json(Box(answer=1))
+    await asyncio.sleep(0.05)
+    assert [c.args[1].body for c in on_message.call_args_list] == [messages.Request(answer=1)]
@@ -0,0 +1,79 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from conductor import messages
+from conductor.outbox import Outbox, COALESCE, DISCONNECT, DROP_OLDEST
+
+
+class StalledSocket:
+    def __init__(self):
+        self.sent = []
+        self.resume = asyncio.Event()
+        self.close = AsyncMock()
+
+    async def send_str(self, data):
+        await self.resume.wait()
+        self.sent.append(data)
+
+
+async def fill(outbox, *events):
+    for event in events:
+        outbox.put(messages.encode(event))
+        await asyncio.sleep(0)
+
+
+async def flush(ws):
+    ws.resume.set()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    return ws.sent
+
+
+async def test_put_does_not_wait_for_socket():
+    ws = StalledSocket()
+    outbox = Outbox(ws, size=2)
+    await fill(outbox, messages.joined('mario'))
+    assert outbox.depth() == 0
+    await fill(outbox, messages.joined('luigi'))
+    assert outbox.depth() == 1
+    assert ws.sent == []
+
+
+async def test_drop_oldest_frame_on_overflow():
+    ws = StalledSocket()
+    outbox = Outbox(ws, size=2, overflow_policy=DROP_OLDEST)
+    await fill(outbox, messages.joined('mario'), messages.joined('luigi'), messages.joined('peach'),
+               messages.joined('toad'))
+    assert await flush(ws) == [messages.encode(messages.joined(user)) for user in ('mario', 'peach', 'toad')]
+
+
+async def test_coalesce_frames_of_same_event_on_overflow():
+    ws = StalledSocket()
+    outbox = Outbox(ws, size=2, overflow_policy=COALESCE)
+    await fill(outbox, messages.joined('mario'), messages.question('1+2?'), messages.joined('luigi'),
+               messages.question('2+1?'))
+    assert await flush(ws) == [
+        messages.encode(messages.joined('mario')),
+        messages.encode(messages.joined('luigi')),
+        messages.encode(messages.question('2+1?'))
+    ]
+
+
+async def test_do_not_coalesce_events_of_different_users():
+    ws = StalledSocket()
+    outbox = Outbox(ws, size=2, overflow_policy=COALESCE)
+    await fill(outbox, messages.joined('peach'), messages.question('1+2?'), messages.joined('mario'),
+               messages.joined('luigi'))
+    assert await flush(ws) == [
+        messages.encode(messages.joined('peach')),
+        messages.encode(messages.joined('mario')),
+        messages.encode(messages.joined('luigi'))
+    ]
+
+
+async def test_disconnect_on_overflow():
+    ws = StalledSocket()
+    outbox = Outbox(ws, size=1, overflow_policy=DISCONNECT)
+    await fill(outbox, messages.joined('mario'), messages.joined('luigi'), messages.joined('peach'))
+    ws.close.assert_called_once()
+    assert outbox.closed
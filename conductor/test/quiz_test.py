@@ -0,0 +1,188 @@
+import asyncio
+
+from aiohttp import web
+import pytest
+
+from conductor.clock import Clock
+from conductor.quiz import OpenTriviaQuizSource, RATE_LIMIT, TOKEN_EMPTY
+from conductor.seen import SeenSet
+
+
+class OpenTriviaStub:
+    def __init__(self, response_codes=(), delay_seconds=0.01, repeat=False):
+        self.response_codes = list(response_codes)
+        self.delay_seconds = delay_seconds
+        self.repeat = repeat
+        self.fetches = 0
+        self.tokens = 0
+        self.peers = set()
+
+    def application(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/api_token.php', self.token),
+            web.get('/api.php', self.questions)
+        ])
+        return app
+
+    async def token(self, request):
+        self.peers.add(request.transport.get_extra_info('peername'))
+        self.tokens += 1
+        return web.json_response({'response_code': 0, 'token': f'token{self.tokens}'})
+
+    async def questions(self, request):
+        self.peers.add(request.transport.get_extra_info('peername'))
+        self.fetches += 1
+        await asyncio.sleep(self.delay_seconds)
+        if self.response_codes:
+            return web.json_response({'response_code': self.response_codes.pop(0), 'results': []})
+        amount = int(request.query['amount'])
+        return web.json_response({'response_code': 0, 'results': [
+            {
+                'question': f'Question {1 if self.repeat else self.fetches}.{i} &amp; more?',
+                'correct_answer': 'yes',
+                'incorrect_answers': ['no', 'maybe', 'never']
+            } for i in range(amount)
+        ]})
+
+
+class SleepRecorder(Clock):
+    def __init__(self):
+        self.sleeps = []
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+async def quiz_source(aiohttp_server, stub, **kwargs):
+    server = await aiohttp_server(stub.application())
+    return OpenTriviaQuizSource(base_url=str(server.make_url('')).rstrip('/'), **kwargs)
+
+
+async def test_fetch_questions(aiohttp_server):
+    stub = OpenTriviaStub()
+    source = await quiz_source(aiohttp_server, stub, fetch_size=2, refill_watermark=0)
+    quiz = await source.next()
+    assert quiz.question == 'Question 1.0 & more?'
+    assert quiz.answers[quiz.answer] == 'yes'
+    await source.close()
+
+
+async def test_refill_in_background_below_watermark(aiohttp_server):
+    stub = OpenTriviaStub()
+    source = await quiz_source(aiohttp_server, stub, fetch_size=4, refill_watermark=2)
+    await source.next()
+    assert stub.fetches == 1
+    await source.next()
+    await source.next()
+    await asyncio.sleep(0.05)
+    assert stub.fetches == 2
+    assert len(source.questions) == 5
+    await source.close()
+
+
+async def test_concurrent_requests_share_a_single_fetch(aiohttp_server):
+    stub = OpenTriviaStub()
+    source = await quiz_source(aiohttp_server, stub, fetch_size=10, refill_watermark=0)
+    quizzes = await asyncio.gather(*[source.next() for _ in range(5)])
+    assert len({quiz.question for quiz in quizzes}) == 5
+    assert stub.fetches == 1
+    await source.close()
+
+
+async def test_retry_with_new_token_after_expiration(aiohttp_server):
+    stub = OpenTriviaStub(response_codes=[TOKEN_EMPTY])
+    source = await quiz_source(aiohttp_server, stub, fetch_size=1, refill_watermark=0, retry_backoff_seconds=0)
+    await source.next()
+    assert stub.tokens == 2
+    await source.close()
+
+
+async def test_fail_after_too_many_tentatives(aiohttp_server):
+    stub = OpenTriviaStub(response_codes=[TOKEN_EMPTY] * 3)
+    source = await quiz_source(aiohttp_server, stub, max_fetch_tentatives=3, retry_backoff_seconds=0)
+    with pytest.raises(RuntimeError):
+        await source.next()
+    await source.close()
+
+
+async def test_do_not_back_off_after_last_tentative(aiohttp_server):
+    stub = OpenTriviaStub(response_codes=[RATE_LIMIT] * 3)
+    clock = SleepRecorder()
+    source = await quiz_source(aiohttp_server, stub, max_fetch_tentatives=3, retry_backoff_seconds=0.2, clock=clock)
+    with pytest.raises(RuntimeError):
+        await source.next()
+    assert clock.sleeps == [0.2, 0.4]
+    await source.close()
+
+
+async def test_create_session_on_first_fetch(aiohttp_server):
+    stub = OpenTriviaStub()
+    source = await quiz_source(aiohttp_server, stub, fetch_size=1, refill_watermark=0)
+    assert source.session is None
+    await source.next()
+    await source.next()
+    assert stub.fetches == 2
+    assert len(stub.peers) == 1
+    await source.close()
+
+
+async def test_give_up_on_hung_upstream(aiohttp_server):
+    stub = OpenTriviaStub(delay_seconds=10)
+    source = await quiz_source(aiohttp_server, stub, max_fetch_tentatives=2, retry_backoff_seconds=0,
+                               read_timeout_seconds=0.05)
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(source.next(), timeout=1)
+    assert stub.fetches == 2
+    await source.close()
+
+
+async def test_pause_fetches_after_too_many_failures(aiohttp_server):
+    stub = OpenTriviaStub(response_codes=[RATE_LIMIT] * 3)
+    source = await quiz_source(aiohttp_server, stub, max_fetch_tentatives=5, retry_backoff_seconds=0,
+                               breaker_threshold=2, breaker_reset_seconds=0.1)
+    with pytest.raises(RuntimeError):
+        await source.next()
+    assert stub.fetches == 2
+    with pytest.raises(RuntimeError):
+        await source.next()
+    assert stub.fetches == 2
+    await asyncio.sleep(0.1)
+    with pytest.raises(RuntimeError):
+        await source.next()
+    assert stub.fetches == 3
+    await asyncio.sleep(0.1)
+    await source.next()
+    assert stub.fetches == 4
+    await source.close()
+
+
+async def test_skip_questions_already_served(aiohttp_server):
+    seen = SeenSet(capacity=100)
+    seen.add('Question 1.0 & more?')
+    stub = OpenTriviaStub(repeat=True)
+    source = await quiz_source(aiohttp_server, stub, fetch_size=2, refill_watermark=0, seen=seen)
+    quiz = await source.next()
+    assert quiz.question == 'Question 1.1 & more?'
+    assert 'Question 1.1 & more?' in seen
+    quiz = await source.next()
+    assert quiz.question in ('Question 1.0 & more?', 'Question 1.1 & more?')
+    await source.close()
+
+
+async def test_warm_up_fills_the_buffer(aiohttp_server):
+    stub = OpenTriviaStub()
+    source = await quiz_source(aiohttp_server, stub, fetch_size=3, refill_watermark=0)
+    await source.warm_up()
+    assert len(source.questions) == 3
+    await source.next()
+    assert stub.fetches == 1
+    await source.close()
+
+
+async def test_warm_up_tolerates_failures(aiohttp_server):
+    stub = OpenTriviaStub(response_codes=[TOKEN_EMPTY])
+    source = await quiz_source(aiohttp_server, stub, max_fetch_tentatives=1, retry_backoff_seconds=0)
+    await source.warm_up()
+    assert not source.questions
+    await source.close()
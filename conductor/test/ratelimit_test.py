@@ -0,0 +1,44 @@
+from conductor.clock import VirtualClock
+from conductor.ratelimit import RateLimiter, RequestLimiter
+
+
+def test_rate_limiter_refills_over_time():
+    clock = VirtualClock()
+    limiter = RateLimiter(rate=1, burst=2, clock=clock)
+    assert limiter.allow('a')
+    assert limiter.allow('a')
+    assert not limiter.allow('a')
+    assert limiter.allow('b')
+    clock.advance(1)
+    assert limiter.allow('a')
+    assert not limiter.allow('a')
+
+
+def test_rate_limiter_forgets_least_recent_keys():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2, clock=VirtualClock())
+    for key in ('a', 'b', 'c'):
+        limiter.allow(key)
+    assert list(limiter.buckets) == ['b', 'c']
+
+
+def test_request_limiter_counts_violations_by_kind():
+    clock = VirtualClock()
+    limiter = RequestLimiter({'challenge': (1, 1)}, clock=clock)
+    assert limiter.allow('challenge')
+    assert not limiter.allow('challenge')
+    assert limiter.allow('answer')
+    assert limiter.violations == 1
+    clock.advance(1)
+    assert limiter.allow('challenge')
+
+
+def test_request_limiter_forgets_old_violations():
+    clock = VirtualClock()
+    limiter = RequestLimiter({'challenge': (0.001, 1)}, clock=clock, window_seconds=10)
+    limiter.allow('challenge')
+    limiter.allow('challenge')
+    clock.advance(5)
+    limiter.allow('challenge')
+    assert limiter.violations == 2
+    clock.advance(5)
+    assert limiter.violations == 1
@@ -0,0 +1,41 @@
+from unittest.mock import AsyncMock
+
+from conductor.results import ResultStore, round_result
+from conductor.server import application
+
+
+async def test_write_results_in_batches(tmp_path):
+    path = str(tmp_path / 'results.db')
+    store = ResultStore(path, batch_size=2, flush_interval_seconds=10)
+    store.start()
+    store.record(round_result('r1', 'Q1?', 'alice', {'bob': 'incorrect'}, 1.5))
+    assert store.db.execute('SELECT count(*) FROM rounds').fetchone() == (0,)
+    store.record(round_result('r1', 'Q2?', None, {'alice': 'timeout', 'bob': None}))
+    await store.close()
+    store = ResultStore(path)
+    assert store.db.execute('SELECT count(*) FROM rounds').fetchone() == (2,)
+    assert store.db.execute('SELECT count(*) FROM losses').fetchone() == (3,)
+    assert store.leaderboard() == [
+        {'user': 'alice', 'wins': 1, 'losses': 1},
+        {'user': 'bob', 'wins': 0, 'losses': 2}
+    ]
+    await store.close()
+
+
+async def test_refresh_leaderboard_after_flush(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'), leaderboard_size=1)
+    store.record(round_result('r1', 'Q1?', 'alice', {}))
+    assert store.leaderboard() == []
+    await store.flush()
+    assert store.leaderboard() == [{'user': 'alice', 'wins': 1, 'losses': 0}]
+    await store.close()
+
+
+async def test_serve_leaderboard(aiohttp_client, tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'))
+    store.record(round_result('r1', 'Q1?', 'alice', {}))
+    await store.flush()
+    client = await aiohttp_client(application(AsyncMock(), shutdown=AsyncMock(), results=store))
+    res = await client.get('/leaderboard')
+    assert await res.json() == [{'user': 'alice', 'wins': 1, 'losses': 0}]
+    await store.close()
@@ -0,0 +1,97 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import aiohttp
+from box import Box
+
+from conductor.network import Network
+from conductor.registry import SocketRegistry
+from conductor.rooms import Room, RoomManager
+from conductor.server import application
+
+
+def room_factory(max_sockets, on_message=AsyncMock()):
+    def new_room(room_id):
+        network = Network(SocketRegistry(max_sockets), on_message=on_message, room=room_id)
+        return Room(room_id, network, conductor=None)
+
+    return new_room
+
+
+async def test_ready_event_contains_room(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=2), max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=id&room=lobby')
+    got = await ws.receive_json()
+    assert got['event'] == 'ready'
+    assert got['room'] == 'lobby'
+
+
+async def test_place_users_in_rooms_with_space(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=2), max_rooms=2)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    sockets = [await client.ws_connect(f'/play?uid=id{i}') for i in range(3)]
+    got = [(await ws.receive_json())['room'] for ws in sockets]
+    assert got[0] == got[1]
+    assert got[2] != got[0]
+
+
+async def test_cannot_exceed_max_rooms_limit(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    await client.ws_connect('/play?uid=id1')
+    ws = await client.ws_connect('/play?uid=id2')
+    got = await ws.receive_json()
+    assert got == Box(event='rejected', reason='maxRoomsReached')
+
+
+async def test_same_uid_in_different_rooms(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=2)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=id&room=a')
+    ws2 = await client.ws_connect('/play?uid=id&room=b')
+    assert (await ws1.receive_json())['event'] == 'ready'
+    assert (await ws2.receive_json())['event'] == 'ready'
+
+
+async def test_publish_is_scoped_to_room(aiohttp_client):
+    async def broadcast_echo(net, message):
+        await net.publish(message.body)
+
+    rooms = RoomManager(room_factory(max_sockets=2, on_message=broadcast_echo), max_rooms=2)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws1 = await client.ws_connect('/play?uid=name1&room=a')
+    ws2 = await client.ws_connect('/play?uid=name2&room=b')
+    await ws1.receive_json()  # receive ready event
+    await ws2.receive_json()  # receive ready event
+    await ws1.send_json(Box(answer=1))
+    await ws2.send_json(Box(answer=2))
+    assert await ws1.receive_json(timeout=1) == Box(answer=1, seq=1)
+    assert await ws2.receive_json(timeout=1) == Box(answer=2, seq=1)
+
+
+async def test_close_empty_rooms(aiohttp_client):
+    rooms = RoomManager(room_factory(max_sockets=1), max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=id')
+    await ws.receive_json()  # receive ready event
+    await ws.close()
+    ws = await client.ws_connect('/play?uid=other')
+    got = await ws.receive_json()
+    assert got['event'] == 'ready'
+
+
+async def test_keep_rooms_of_suspended_players_until_grace_expires(aiohttp_client):
+    def new_room(room_id):
+        network = Network(SocketRegistry(max_sockets=1), room=room_id, resume_grace_seconds=0.1)
+        return Room(room_id, network, conductor=None)
+
+    rooms = RoomManager(new_room, max_rooms=1)
+    client = await aiohttp_client(application(rooms, shutdown=AsyncMock()))
+    ws = await client.ws_connect('/play?uid=id&room=a')
+    await ws.receive_json()  # receive ready event
+    await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+    ws = await client.ws_connect('/play?uid=other&room=b')
+    assert await ws.receive_json() == Box(event='rejected', reason='maxRoomsReached')
+    await asyncio.sleep(0.2)
+    assert rooms.rooms == {}
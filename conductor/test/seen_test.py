@@ -0,0 +1,37 @@
+from conductor.seen import SeenSet
+
+
+def test_add_reports_new_questions():
+    seen = SeenSet(capacity=100)
+    assert seen.add('Q1?')
+    assert not seen.add('Q1?')
+    assert 'Q1?' in seen
+    assert 'Q2?' not in seen
+
+
+def test_forget_oldest_questions_after_rotations():
+    seen = SeenSet(capacity=10)
+    for i in range(10):
+        seen.add(f'Q{i}?')
+    seen.add('Q10?')
+    assert 'Q0?' in seen
+    for i in range(11, 21):
+        seen.add(f'Q{i}?')
+    assert 'Q0?' not in seen
+    assert 'Q20?' in seen
+
+
+def test_few_false_positives():
+    seen = SeenSet(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        seen.add(f'Q{i}?')
+    assert sum(f'Other {i}?' in seen for i in range(1000)) < 30
+
+
+def test_persist_across_restarts(tmp_path):
+    path = str(tmp_path / 'seen')
+    seen = SeenSet(capacity=10, path=path)
+    seen.add('Q1?')
+    seen.close()
+    assert 'Q1?' in SeenSet(capacity=10, path=path)
+    assert 'Q1?' not in SeenSet(capacity=20, path=path)
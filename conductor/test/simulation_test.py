@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from conductor.clock import VirtualClock
+from conductor.simulation import run
+
+
+def test_virtual_clock_does_not_wait_for_real_time():
+    async def wait():
+        await clock.sleep(3600)
+        try:
+            await clock.wait_for(asyncio.sleep(60), timeout=5)
+        except asyncio.TimeoutError:
+            return clock.time()
+
+    clock = VirtualClock()
+    start = time.perf_counter()
+    assert clock.run(wait()) == 3605
+    assert time.perf_counter() - start < 1
+
+
+def test_simulation_plays_requested_rounds():
+    report = run(rounds=50, players=3, seed=1)
+    assert report.rounds == 50
+    assert report.virtual_seconds > report.wall_seconds
+
+
+def test_simulation_is_deterministic():
+    assert run(rounds=50, players=3, seed=1).digest == run(rounds=50, players=3, seed=1).digest
+    assert run(rounds=50, players=3, seed=1).digest != run(rounds=50, players=3, seed=2).digest
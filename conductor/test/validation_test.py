@@ -0,0 +1,35 @@
+from conductor.validation import compile_schema
+
+schema = {
+    'uid': {
+        'type': 'string',
+        'empty': False
+    },
+    'room': {
+        'type': 'string',
+        'maxlength': 3
+    },
+    'encoding': {
+        'type': 'string',
+        'allowed': ('json', 'binary')
+    }
+}
+
+
+def test_accept_valid_documents():
+    validate = compile_schema(schema)
+    assert validate({'uid': 'id'})
+    assert validate({'uid': 'id', 'room': 'abc', 'encoding': 'binary'})
+
+
+def test_reject_invalid_values():
+    validate = compile_schema(schema)
+    assert not validate({'uid': ''})
+    assert not validate({'uid': 1})
+    assert not validate({'uid': 'id', 'room': 'abcd'})
+    assert not validate({'uid': 'id', 'encoding': 'xml'})
+
+
+def test_reject_unknown_fields_unless_allowed():
+    assert not compile_schema(schema)({'uid': 'id', 'other': 'x'})
+    assert compile_schema(schema, allow_unknown=True)({'uid': 'id', 'other': 'x'})
@@ -0,0 +1,106 @@
+// Decoder of the binary wire protocol, see conductor/codec.py
+const EVENTS = [
+  "question",
+  "snapshot",
+  "joined",
+  "left",
+  "challenged",
+  "reply",
+  "lost",
+  "end"
+];
+const BATCH = 0x7f;
+const CHALLENGE = 0;
+const ANSWER = 1;
+
+const utf8 = new TextDecoder();
+
+class Reader {
+  constructor(buffer, uids) {
+    this.bytes = new Uint8Array(buffer);
+    this.offset = 0;
+    this.uids = uids;
+  }
+
+  uint() {
+    let value = 0;
+    let shift = 0;
+    for (;;) {
+      const byte = this.bytes[this.offset++];
+      value += (byte & 0x7f) * 2 ** shift;
+      if (byte < 0x80) return value;
+      shift += 7;
+    }
+  }
+
+  text(length) {
+    const start = this.offset;
+    this.offset += length;
+    return utf8.decode(this.bytes.subarray(start, this.offset));
+  }
+
+  str() {
+    return this.text(this.uint());
+  }
+
+  optStr() {
+    const length = this.uint();
+    return length === 0 ? null : this.text(length - 1);
+  }
+
+  definition() {
+    const index = this.uint();
+    const user = this.str();
+    this.uids[index] = user;
+    return user;
+  }
+
+  user() {
+    const ref = this.uint();
+    if (ref === 0) return null;
+    if (ref === 1) return this.str();
+    return this.uids[ref - 2];
+  }
+
+  list(read) {
+    const items = [];
+    for (let length = this.uint(); length > 0; length--) items.push(read());
+    return items;
+  }
+}
+
+const decoders = {
+  question: r => ({ question: r.str() }),
+  snapshot: r => ({
+    question: r.optStr(),
+    users: r.list(() => r.definition()),
+    lost: r.list(() => r.user()),
+    challenged: r.user()
+  }),
+  joined: r => ({ user: r.definition() }),
+  left: r => ({ user: r.user() }),
+  challenged: r => ({ user: r.user(), contenders: r.list(() => r.user()) }),
+  reply: r => ({ answers: r.list(() => r.str()), timeout: r.uint() }),
+  lost: r => ({ user: r.user(), reason: r.optStr() }),
+  end: r => ({ winner: r.user(), answer: r.uint() })
+};
+
+function readEvent(reader, code) {
+  const event = EVENTS[code];
+  const seq = reader.uint();
+  const data = { event, ...decoders[event](reader) };
+  if (seq > 0) data.seq = seq - 1;
+  return data;
+}
+
+export function decodeEvents(buffer, uids) {
+  const reader = new Reader(buffer, uids);
+  const code = reader.uint();
+  if (code !== BATCH) return [readEvent(reader, code)];
+  return reader.list(() => readEvent(reader, reader.uint()));
+}
+
+export function encodeRequest(data) {
+  if (data.action === "challenge") return new Uint8Array([CHALLENGE]);
+  return new Uint8Array([ANSWER, data.answer]);
+}
@@ -4,6 +4,7 @@ import { useImmer } from "use-immer";
 import { useTranslation } from "react-i18next";
 import { useSnackbar } from "notistack";
 import CircularProgress from "@material-ui/core/CircularProgress";
+import Typography from "@material-ui/core/Typography";
 import { Welcome } from "./Welcome";
 import {
   QuestionPanel,
@@ -14,7 +15,7 @@ import {
 import { Players, Player } from "./Players";
 import { Countdown, useCountdown } from "./Countdown";
 import { Center } from "./Layout";
-import { openSocket } from "./Socket";
+import { openSocket, resumeSocket } from "./Socket";
 import { createBrowserHistory } from "history";
 
 const history = createBrowserHistory();
@@ -25,7 +26,7 @@ function Game() {
   const [connection, setConnection] = useState(null);
   const handleLogin = connection => {
     setConnection(connection);
-    saveUsername(connection.username);
+    saveLocation(connection.username, connection.socket.room);
   };
   const handleError = err => {
     enqueueSnackbar(t(err.message || "Something goes wrong..."), {
@@ -33,35 +34,51 @@ function Game() {
     });
   };
   const handleExit = () => setConnection(null);
-  const saveUsername = username => {
-    history.push(`?uid=${username}`);
+  const handleReconnect = socket => setConnection({ ...connection, socket });
+  const saveLocation = (username, room) => {
+    const query = new URLSearchParams({ uid: username });
+    if (room) query.set("room", room);
+    history.push(`?${query}`);
   };
   const getUsername = () => {
     return new URLSearchParams(history.location.search).get("uid");
   };
+  const getRoom = () => {
+    return new URLSearchParams(history.location.search).get("room");
+  };
   if (!connection) {
     return (
       <Login
         initialUsername={getUsername()}
+        room={getRoom()}
         onLogin={handleLogin}
         onError={handleError}
       />
     );
   }
-  return <Session {...connection} onExit={handleExit} />;
+  return (
+    <Session
+      {...connection}
+      onExit={handleExit}
+      onReconnect={handleReconnect}
+    />
+  );
 }
 
-function Login({ initialUsername, onLogin, onError }) {
+function Login({ initialUsername, room, onLogin, onError }) {
+  const { t } = useTranslation();
   const [autoLogin, setAutoLogin] = useState(Boolean(initialUsername));
   const [entering, setEntering] = useState(false);
+  const [queue, setQueue] = useState(null);
   const handleEnter = async username => {
     try {
       setEntering(true);
-      const socket = await openSocket(username);
+      const socket = await openSocket(username, room, null, null, setQueue);
       onLogin({ socket, username });
     } catch (err) {
       setEntering(false);
       setAutoLogin(false);
+      setQueue(null);
       onError(err);
     }
   };
@@ -71,12 +88,17 @@ function Login({ initialUsername, onLogin, onError }) {
   return (
     <Center>
       {autoLogin && <CircularProgress />}
+      {queue && (
+        <Typography>
+          {t("Waiting for a seat: {{position}} in line, about {{wait}} seconds", queue)}
+        </Typography>
+      )}
       {!autoLogin && <Welcome onEnter={handleEnter} entering={entering} />}
     </Center>
   );
 }
 
-function Session({ socket, username, onExit }) {
+function Session({ socket, username, onExit, onReconnect }) {
   const { t } = useTranslation();
   const { enqueueSnackbar, closeSnackbar } = useSnackbar();
   const [session, updateSession] = useImmer({
@@ -95,10 +117,25 @@ function Session({ socket, username, onExit }) {
     });
     socket.sendJson({ answer: index });
   };
-  socket.onmessage = message => {
-    const data = JSON.parse(message.data);
+  socket.listen(data => {
     console.log("message:", data);
     switch (data.event) {
+      case "snapshot":
+        return updateSession(it => {
+          it.question = data.question;
+          it.answers = [];
+          it.answer = null;
+          it.players = data.users.map(user => ({ username: user }));
+          it.playersStatus = {};
+          data.lost.forEach(user => {
+            it.playersStatus[user] = "loser";
+          });
+          if (data.challenged) {
+            it.playersStatus[data.challenged] = "challenging";
+          }
+          it.challenging = Boolean(data.challenged);
+          it.acceptAnswer = !data.lost.includes(username);
+        });
       case "question":
         closeSnackbar();
         return updateSession(it => {
@@ -166,8 +203,15 @@ function Session({ socket, username, onExit }) {
       default:
         console.log("unexpected message", data);
     }
+  });
+  socket.onclose = async event => {
+    if (event.code === 1000 || event.code === 1008) return onExit();
+    try {
+      onReconnect(await resumeSocket(username, socket));
+    } catch (err) {
+      onExit();
+    }
   };
-  socket.onclose = onExit;
   const {
     question,
     answers,
@@ -1,27 +1,77 @@
-export async function openSocket(username) {
+import { decodeEvents, encodeRequest } from "./Codec";
+
+const encoding = process.env.REACT_APP_SOCKET_ENCODING || "json";
+const resumeGraceSeconds = Number(process.env.REACT_APP_RESUME_GRACE_SECONDS || 10);
+
+export async function openSocket(username, room, redirectPort, resume, onQueued) {
   return new Promise((resolve, reject) => {
     const { protocol, hostname, port } = window.location;
     const proto = protocol === "https:" ? "wss:" : "ws:";
     const uid = encodeURIComponent(username);
-    const socketPort = process.env.REACT_APP_SOCKET_PORT || port;
-    const url = `${proto}//${hostname}:${socketPort}/play?uid=${uid}`;
+    const socketPort = redirectPort || process.env.REACT_APP_SOCKET_PORT || port;
+    let query = `uid=${uid}&encoding=${encoding}`;
+    if (room) query += `&room=${encodeURIComponent(room)}`;
+    if (resume) query += `&token=${encodeURIComponent(resume.token)}&seq=${resume.seq}`;
+    const url = `${proto}//${hostname}:${socketPort}/play?${query}`;
     const socket = new WebSocket(url);
+    const uids = (resume && resume.uids) || [];
+    socket.binaryType = "arraybuffer";
     socket.sendJson = data => {
       console.log("send", data);
-      socket.send(JSON.stringify(data));
+      socket.send(
+        encoding === "binary" ? encodeRequest(data) : JSON.stringify(data)
+      );
     };
-    socket.onmessage = message => {
-      const data = JSON.parse(message.data);
+    socket.port = redirectPort;
+    socket.uids = uids;
+    socket.decode = message => {
+      const events =
+        typeof message.data === "string"
+          ? [].concat(JSON.parse(message.data))
+          : decodeEvents(message.data, uids);
+      for (const data of events) {
+        if (data.seq > socket.seq) socket.seq = data.seq;
+      }
+      return events;
+    };
+    socket.listen = handler => {
+      socket.onmessage = message => socket.decode(message).forEach(handler);
+    };
+    socket.listen(data => {
       console.log("message:", data);
       switch (data.event) {
         case "rejected":
-          return reject(Error(data.reason));
+          return reject(Object.assign(Error(data.reason), { rejected: true }));
+        case "redirect":
+          return resolve(
+            openSocket(username, data.room, data.port, resume, onQueued)
+          );
+        case "queued":
+          return onQueued && onQueued(data);
         case "ready":
+          socket.room = data.room;
+          socket.token = data.token;
+          socket.seq = data.seq;
           return resolve(socket);
         default:
           console.log("unexpected message", data);
       }
-    };
+    });
     socket.onerror = err => reject(err);
+    socket.onclose = event =>
+      reject(Object.assign(Error("Connection closed"), { code: event.code }));
   });
 }
+
+export async function resumeSocket(username, socket) {
+  const resume = { token: socket.token, seq: socket.seq, uids: socket.uids };
+  const deadline = Date.now() + resumeGraceSeconds * 1000;
+  for (let delay = 250; ; delay = Math.min(delay * 2, 4000)) {
+    try {
+      return await openSocket(username, socket.room, socket.port, resume);
+    } catch (err) {
+      if (err.rejected || Date.now() + delay > deadline) throw err;
+      await new Promise(resolve => setTimeout(resolve, delay));
+    }
+  }
+}